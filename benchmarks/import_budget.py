@@ -0,0 +1,79 @@
+"""Import-time budget for the headless modules.
+
+    python benchmarks/import_budget.py [--repeat 5]
+
+Each module is imported in a fresh interpreter, best of ``--repeat`` runs.
+It must load within its budget and without any of the dependencies it is
+not allowed to pull in. Exits 1 on any violation, so a stray top-level
+``import pandas`` fails the check rather than quietly adding to startup.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("pandas", "sklearn", "joblib", "plotly", "streamlit", "requests", "scipy")
+
+# module -> (budget in ms, modules it must not import)
+BUDGETS = {
+    "smart_soil": (20, HEAVY + ("numpy",)),
+    "smart_soil.crops": (20, HEAVY + ("numpy",)),
+    "smart_soil.fertilizer": (30, HEAVY + ("numpy",)),
+    "smart_soil.metrics": (30, HEAVY + ("numpy",)),
+    "smart_soil.sensors": (20, HEAVY + ("numpy",)),
+    "smart_soil.weather_client": (60, HEAVY + ("numpy",)),
+    "smart_soil.weather": (250, HEAVY),
+    "smart_soil.forest": (250, HEAVY),
+    "smart_soil.model_registry": (250, HEAVY),
+    "smart_soil.predict": (250, HEAVY),
+    "smart_soil.blend": (250, HEAVY),
+    "smart_soil.suitability": (250, HEAVY),
+    "smart_soil.server": (400, HEAVY),
+}
+
+_CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def measure(module, forbidden, repeat):
+    """(best import time in ms, forbidden modules that got imported)."""
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-c", _CHILD, module, *forbidden],
+                                 capture_output=True, text=True, cwd=ROOT, check=True)
+        result = json.loads(process.stdout)
+        best = min(best, result["ms"])
+        loaded = result["loaded"]
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check import times of the headless modules.")
+    parser.add_argument("modules", nargs="*", help="modules to check (default: all budgeted ones)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per module, best counts (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for module in args.modules or BUDGETS:
+        budget, forbidden = BUDGETS[module]
+        ms, loaded = measure(module, forbidden, args.repeat)
+        problems = []
+        if ms > budget:
+            problems.append(f"over budget ({budget} ms)")
+        if loaded:
+            problems.append(f"imports {', '.join(loaded)}")
+        failures += bool(problems)
+        print(f"{module:28} {ms:8.1f} ms  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
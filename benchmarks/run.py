@@ -0,0 +1,369 @@
+"""Offline benchmark suite for the app's hot paths and the trainer.
+
+    python benchmarks/run.py                          # all benchmarks, JSON on stdout
+    python benchmarks/run.py -o results.json predict_single_sklearn weather_fetch_parse
+    python benchmarks/run.py -o new.json --baseline old.json --tolerance 0.25
+
+Every benchmark runs in a fresh interpreter, so its peak RSS is its own.
+Weather requests go to a local stub serving a recorded 40-slot forecast.
+The JSON report has, per benchmark, p50/p99/mean latency of one call,
+throughput in items per second (rows, readings, slots... per call times
+calls per second) and peak RSS. With ``--baseline`` any benchmark whose p50
+grew by more than ``--tolerance`` is reported and the exit status is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from importlib import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODEL_PATH = os.path.join(ROOT, "fertilizer_model.pkl")
+DATA_PATH = os.path.join(ROOT, "dataset.csv")
+PAYLOAD_PATH = os.path.join(ROOT, "benchmarks", "forecast_40.json")
+
+# name -> (setup, iterations, items per call, warmup calls)
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations, items=1, warmup=1):
+    """Register ``setup() -> call``; ``call()`` is what gets timed."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, iterations, items, warmup)
+        return setup
+    return register
+
+
+def _sample_rows(n, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    from smart_soil.predict import FEATURES
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "pH": np.round(rng.uniform(5.0, 8.0, n), 1),
+        "N": rng.integers(20, 101, n).astype(float),
+        "P": rng.integers(20, 101, n).astype(float),
+        "K": rng.integers(20, 101, n).astype(float),
+        "Moisture": np.round(rng.uniform(30.0, 70.0, n), 1),
+    })[FEATURES]
+
+
+def _forest_dir():
+    import joblib
+
+    from smart_soil.forest import export_forest
+
+    directory = tempfile.mkdtemp(prefix="bench-forest-")
+    export_forest(joblib.load(MODEL_PATH), directory)
+    return directory
+
+
+def _payload():
+    with open(PAYLOAD_PATH) as f:
+        return json.load(f)
+
+
+@benchmark("model_load_joblib", iterations=5)
+def _model_load_joblib():
+    import joblib
+    return lambda: joblib.load(MODEL_PATH)
+
+
+@benchmark("model_load_forest", iterations=20)
+def _model_load_forest():
+    from smart_soil.forest import load_forest
+    directory = _forest_dir()
+    return lambda: load_forest(directory)
+
+
+@benchmark("predict_single_sklearn", iterations=200)
+def _predict_single_sklearn():
+    import joblib
+    model, row = joblib.load(MODEL_PATH), _sample_rows(1)
+    return lambda: model.predict_proba(row)
+
+
+@benchmark("predict_single_forest", iterations=500)
+def _predict_single_forest():
+    from smart_soil.forest import load_forest
+    model, row = load_forest(_forest_dir()), _sample_rows(1)
+    return lambda: model.predict_proba(row)
+
+
+@benchmark("predict_batch_10k_sklearn", iterations=10, items=10_000)
+def _predict_batch_sklearn():
+    import joblib
+
+    from smart_soil.predict import predict_batch
+    model, rows = joblib.load(MODEL_PATH), _sample_rows(10_000)
+    return lambda: predict_batch(rows, model)
+
+
+@benchmark("predict_batch_10k_forest", iterations=10, items=10_000)
+def _predict_batch_forest():
+    from smart_soil.forest import load_forest
+    from smart_soil.predict import predict_batch
+    model, rows = load_forest(_forest_dir()), _sample_rows(10_000)
+    return lambda: predict_batch(rows, model)
+
+
+@benchmark("requirements_scalar_10k", iterations=10, items=10_000)
+def _requirements_scalar():
+    from smart_soil.fertilizer import CROP_NAMES, calculate_fertilizer_requirements
+    rows = _sample_rows(10_000)
+    readings = [{"nitrogen": n, "phosphorus": p, "potassium": k} for n, p, k in rows[["N", "P", "K"]].to_numpy()]
+    crops = [CROP_NAMES[i % len(CROP_NAMES)] for i in range(len(readings))]
+    return lambda: [calculate_fertilizer_requirements(r, c) for r, c in zip(readings, crops)]
+
+
+@benchmark("requirements_batch_100k", iterations=20, items=100_000)
+def _requirements_batch():
+    import numpy as np
+
+    from smart_soil.fertilizer import CROP_NAMES, calculate_fertilizer_requirements_batch
+    rows = _sample_rows(100_000)
+    crops = np.arange(len(rows)) % len(CROP_NAMES)
+    return lambda: calculate_fertilizer_requirements_batch(rows["N"], rows["P"], rows["K"], crops)
+
+
+@benchmark("blend_batch_5k", iterations=20, items=5_000)
+def _blend_batch():
+    import numpy as np
+
+    from smart_soil.blend import BlendOptimizer, field_deficits
+    from smart_soil.fertilizer import CROP_NAMES
+    rows = _sample_rows(5_000)
+    crops = np.arange(len(rows)) % len(CROP_NAMES)
+    deficits = field_deficits(rows["N"], rows["P"], rows["K"], crops)
+    # A fresh optimizer per call, so every call pays for its LP solves
+    return lambda: BlendOptimizer().solve_batch(deficits)
+
+
+@benchmark("suitability_rank_100k", iterations=20, items=100_000)
+def _suitability_rank():
+    import numpy as np
+
+    from smart_soil.suitability import rank_crops
+    rows = _sample_rows(100_000)
+    rng = np.random.default_rng(1)
+    temperature, rainfall = rng.uniform(15.0, 35.0, len(rows)), rng.uniform(0.0, 60.0, len(rows))
+    return lambda: rank_crops(rows["N"], rows["P"], rows["K"], rows["pH"], temperature, rainfall, 7, top=3)
+
+
+@benchmark("weather_fetch_parse", iterations=50, items=40)
+def _weather_fetch_parse():
+    # What get_real_weather_data does on a cache miss, against the local stub
+    from benchmarks.stub_weather import start
+    from smart_soil.weather import parse_forecast
+    from smart_soil.weather_cache import ForecastCache
+    from smart_soil.weather_client import WeatherClient
+
+    client = WeatherClient(base_url=start().url, cache=ForecastCache(), retries=0)
+    return lambda: parse_forecast(client.get_forecast(20.5937, 78.9629, "benchmark", use_cache=False))
+
+
+@benchmark("weather_parse", iterations=500, items=40)
+def _weather_parse():
+    from smart_soil.weather import parse_forecast
+    payload = _payload()
+    return lambda: parse_forecast(payload)
+
+
+@benchmark("wind_direction", iterations=500, items=40)
+def _wind_direction():
+    from smart_soil.weather import get_wind_direction
+    degrees = [item["wind"]["deg"] for item in _payload()["list"]]
+    return lambda: [get_wind_direction(d) for d in degrees]
+
+
+@benchmark("wind_directions_vectorized", iterations=500, items=40)
+def _wind_directions():
+    import numpy as np
+
+    from smart_soil.weather import wind_directions
+    degrees = np.array([item["wind"]["deg"] for item in _payload()["list"]])
+    return lambda: wind_directions(degrees)
+
+
+@benchmark("historical_data", iterations=200)
+def _historical_data():
+    from smart_soil.history import generate_historical_data
+    return lambda: generate_historical_data("Rice")
+
+
+@benchmark("figure_soil_gauges", iterations=20)
+def _figure_soil_gauges():
+    from smart_soil.figures import build_soil_gauges
+    from smart_soil.sensors import get_sensor_readings
+    readings = get_sensor_readings()
+    return lambda: build_soil_gauges(readings)
+
+
+@benchmark("figure_weather", iterations=20)
+def _figure_weather():
+    from smart_soil.figures import build_weather_figure
+    from smart_soil.weather import parse_forecast
+    forecast = parse_forecast(_payload())
+    return lambda: build_weather_figure(forecast)
+
+
+@benchmark("figure_history", iterations=20)
+def _figure_history():
+    from smart_soil.figures import build_history_figure
+    from smart_soil.history import generate_historical_data
+    history = generate_historical_data("Rice")
+    return lambda: build_history_figure(history)
+
+
+@benchmark("train_end_to_end", iterations=3, warmup=0)
+def _train_end_to_end():
+    from train_fertilizer_model import train
+    output = os.path.join(tempfile.mkdtemp(prefix="bench-train-"), "model.pkl")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            train(DATA_PATH, output)
+    return run
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def run_benchmark(name, scale=1.0):
+    """Time one benchmark in this process and return its result dict."""
+    import numpy as np
+
+    setup, iterations, items, warmup = BENCHMARKS[name]
+    call = setup()
+    for _ in range(warmup):
+        call()
+    times = []
+    for _ in range(max(1, int(iterations * scale))):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    times = np.array(times)
+    return {
+        "iterations": len(times),
+        "items_per_call": items,
+        "p50_ms": float(np.percentile(times, 50) * 1000),
+        "p99_ms": float(np.percentile(times, 99) * 1000),
+        "mean_ms": float(times.mean() * 1000),
+        "throughput_per_s": float(items * len(times) / times.sum()),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _run_isolated(name, scale):
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, "--scale", str(scale)],
+                             capture_output=True, text=True, cwd=ROOT)
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "failed"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    versions = {}
+    for package in ("numpy", "pandas", "scikit-learn", "joblib", "plotly", "requests"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=ROOT).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose p50 regressed by more than ``tolerance`` against ``baseline``."""
+    regressions = {}
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "p50_ms" not in before or "p50_ms" not in result:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions[name] = {"baseline_p50_ms": before["p50_ms"], "p50_ms": result["p50_ms"],
+                                 "ratio": round(ratio, 3)}
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every iteration count (default: 1)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run everything in this interpreter (faster, but peak RSS is cumulative)")
+    parser.add_argument("--baseline", help="previous JSON report to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p50 slowdown against the baseline (default: %(default)s)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    if args.child:
+        print(json.dumps(run_benchmark(args.child, args.scale)))
+        return 0
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        result = run_benchmark(name, args.scale) if args.in_process else _run_isolated(name, args.scale)
+        results[name] = result
+        if "error" in result:
+            print(f"{name:28} FAILED: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{name:28} p50 {result['p50_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms  "
+                  f"{result['throughput_per_s']:14.1f}/s  rss {result['peak_rss_mb']:7.1f} MB", file=sys.stderr)
+
+    report = {"environment": environment(), "results": results}
+    status = 1 if any("error" in r for r in results.values()) else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+        for name, regression in report["regressions"].items():
+            print(f"REGRESSION {name}: p50 {regression['baseline_p50_ms']:.3f} -> {regression['p50_ms']:.3f} ms "
+                  f"(x{regression['ratio']})", file=sys.stderr)
+        status = status or (1 if report["regressions"] else 0)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Local stand-in for the OpenWeatherMap forecast API.
+
+Serves a recorded 40-slot forecast for every request, so the weather path
+can be timed offline and without an API key. Point the app at it with
+
+    python benchmarks/stub_weather.py --port 8600
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8600/forecast streamlit run app.py
+"""
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAYLOAD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "forecast_40.json")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubWeatherServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), payload_path=PAYLOAD_PATH):
+        with open(payload_path, "rb") as f:
+            # Re-encoded compactly, as the real API sends it
+            self.body = json.dumps(json.load(f), separators=(",", ":")).encode()
+        self.requests = 0
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/forecast"
+
+
+def start(port=0, payload_path=PAYLOAD_PATH):
+    """Serve in a background thread; returns the server (``.url``, ``.requests``)."""
+    server = StubWeatherServer(("127.0.0.1", port), payload_path)
+    threading.Thread(target=server.serve_forever, name="stub-weather", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a recorded OpenWeatherMap forecast.")
+    parser.add_argument("--port", type=int, default=8600, help="port (default: %(default)s)")
+    parser.add_argument("--payload", default=PAYLOAD_PATH, help="recorded forecast JSON")
+    args = parser.parse_args()
+    server = StubWeatherServer(("127.0.0.1", args.port), args.payload)
+    print(f"Serving {args.payload} at {server.url}")
+    server.serve_forever()
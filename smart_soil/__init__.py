@@ -0,0 +1,42 @@
+"""Headless building blocks for the Smart Soil Analysis System.
+
+The common entry points are re-exported here and imported on first access,
+so ``from smart_soil import CROPS`` does not pull in numpy, pandas or
+scikit-learn:
+
+    from smart_soil import CROPS, calculate_fertilizer_requirements
+"""
+import importlib
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    "CROPS": "crops",
+    "FERTILIZERS": "crops",
+    "calculate_fertilizer_requirements": "fertilizer",
+    "calculate_fertilizer_requirements_batch": "fertilizer",
+    "get_sensor_readings": "sensors",
+    "get_wind_direction": "weather",
+    "parse_forecast": "weather",
+    "WeatherClient": "weather_client",
+    "WeatherAPIError": "weather_client",
+    "default_model_path": "model_registry",
+    "get_model": "model_registry",
+    "FEATURES": "predict",
+    "predict_batch": "predict",
+    "predict_proba_batch": "predict",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,200 @@
+"""Micro-batching in front of model inference.
+
+Scoring one row at a time is dominated by per-call overhead (input
+validation, setting up the tree traversal), not by the trees themselves.
+``MicroBatcher`` lets any number of threads (Streamlit sessions, server
+request handlers) submit rows and get a future back; a single scheduler
+thread gathers submissions until ``max_batch`` rows are queued or the
+oldest has waited ``max_wait`` seconds, scores them with one vectorized
+call and resolves every caller's future with its own slice.
+
+Histograms of batch sizes, the queue depth seen by arriving submissions
+and the time from submission to result are kept for tuning ``max_batch``
+and ``max_wait`` against each other.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from smart_soil.metrics import Histogram
+from smart_soil.model_registry import default_model_path, get_model
+from smart_soil.predict import FEATURES, feature_matrix, predict_proba_batch
+
+DEFAULT_MAX_BATCH = 512
+DEFAULT_MAX_WAIT = 0.005
+
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class _Submission:
+    __slots__ = ("rows", "future", "submitted")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class MicroBatcher:
+    """Batches concurrent ``predict(X) -> (classes, proba)`` calls.
+
+    A submission larger than ``max_batch`` is scored as a batch of its own;
+    submissions are never split.
+    """
+
+    def __init__(self, predict, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, name="micro-batcher"):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.queue_depths = Histogram((0,) + SIZE_BUCKETS)
+        self.latencies = Histogram(LATENCY_BUCKETS)
+        self._pending = deque()
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    @property
+    def queue_depth(self):
+        """Rows submitted but not yet picked up for scoring."""
+        return self._pending_rows
+
+    def submit(self, rows):
+        """Queue rows (an (n, 5) array or a list of readings); returns a Future of (classes, proba)."""
+        if isinstance(rows, (list, tuple)) and rows and isinstance(rows[0], dict):
+            rows = feature_matrix(rows)
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if rows.ndim != 2 or rows.shape[1] != len(FEATURES):
+            raise ValueError(f"Expected rows of {len(FEATURES)} features {FEATURES}, got shape {rows.shape}")
+
+        submission = _Submission(rows)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self._thread is None:
+                # Started on first use, so a batcher created before a fork
+                # does not leave the child without its thread
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self.queue_depths.observe(self._pending_rows)
+            self._pending.append(submission)
+            self._pending_rows += len(rows)
+            self._cond.notify()
+        return submission.future
+
+    def predict_proba(self, rows, timeout=None):
+        """Blocking ``submit``: (classes, probability rows) for ``rows``."""
+        return self.submit(rows).result(timeout)
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self._closed)
+            if not self._pending:
+                return None
+            # Wait for more rows until the batch is full or the oldest
+            # submission has waited max_wait
+            deadline = self._pending[0].submitted + self.max_wait
+            while self._pending_rows < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._pending.popleft()]
+            rows = len(batch[0].rows)
+            while self._pending and rows + len(self._pending[0].rows) <= self.max_batch:
+                submission = self._pending.popleft()
+                batch.append(submission)
+                rows += len(submission.rows)
+            self._pending_rows -= rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._score(batch)
+
+    def _score(self, batch):
+        batch = [s for s in batch if s.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            classes, proba = self.predict(np.concatenate([s.rows for s in batch]))
+        except Exception as e:
+            for submission in batch:
+                submission.future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(proba)
+        self.batch_sizes.observe(len(proba))
+        done = time.perf_counter()
+        start = 0
+        for submission in batch:
+            end = start + len(submission.rows)
+            submission.future.set_result((classes, proba[start:end]))
+            self.latencies.observe(done - submission.submitted)
+            start = end
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "queue_depth": self.queue_depth,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_depth_on_submit": self.queue_depths.snapshot(),
+            "latency_seconds": self.latencies.snapshot(),
+        }
+
+    def prometheus(self, prefix):
+        lines = [
+            f"# TYPE {prefix}_batches_total counter", f"{prefix}_batches_total {self.batches}",
+            f"# TYPE {prefix}_rows_total counter", f"{prefix}_rows_total {self.rows}",
+            f"# TYPE {prefix}_queue_depth gauge", f"{prefix}_queue_depth {self.queue_depth}",
+        ]
+        lines += self.batch_sizes.prometheus(f"{prefix}_batch_size")
+        lines += self.queue_depths.prometheus(f"{prefix}_queue_depth_on_submit")
+        lines += self.latencies.prometheus(f"{prefix}_latency_seconds")
+        return lines
+
+    def close(self):
+        """Score what is queued, then stop the scheduler thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+_default_batcher = None
+_default_lock = threading.Lock()
+
+
+def default_batcher():
+    """Process-wide batcher scoring with the registry's current model.
+
+    Tuned with PREDICT_MAX_BATCH and PREDICT_MAX_WAIT_MS.
+    """
+    global _default_batcher
+    with _default_lock:
+        if _default_batcher is None:
+            mmap_mode = os.environ.get("MODEL_MMAP_MODE") or None
+            _default_batcher = MicroBatcher(
+                lambda X: predict_proba_batch(X, get_model(default_model_path(), mmap_mode)),
+                max_batch=int(os.environ.get("PREDICT_MAX_BATCH", DEFAULT_MAX_BATCH)),
+                max_wait=float(os.environ.get("PREDICT_MAX_WAIT_MS", DEFAULT_MAX_WAIT * 1000)) / 1000,
+            )
+        return _default_batcher
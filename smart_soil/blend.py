@@ -0,0 +1,283 @@
+"""Least-cost fertilizer blends over the FERTILIZERS catalog.
+
+For one field the cheapest product mix covering its nutrient deficits
+(kg/ha of N, P, K and micronutrients) is a small LP:
+
+    minimize  price · x   subject to   grade · x >= deficit,   x >= 0
+
+where ``x`` is kg/ha of each product and ``grade`` counts every nutrient
+a product carries, so DAP covers part of the N deficit as well as P. As
+all brands of a product have the same grade, each product is bought from
+its cheapest allowed brand.
+
+Batches are solved by reusing optimal bases. Fields only differ in their
+deficits ``d``; a basis ``B`` whose reduced costs are non-negative (dual
+feasible, independent of ``d``) is optimal for every field with
+``B⁻¹d >= 0`` (primal feasible). Each basis found by HiGHS is tested
+against all unsolved fields with one matrix product, so a batch needs one
+LP solve per distinct optimal basis, a handful for thousands of fields,
+and bases are kept for later batches.
+
+    python -m smart_soil.blend fields.csv -o blends.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import threading
+
+import numpy as np
+
+from smart_soil.crops import FERTILIZER_PRICES, FERTILIZERS
+from smart_soil.fertilizer import CROP_NAMES, calculate_fertilizer_requirements_batch
+from smart_soil.metrics import timed
+
+# Nutrients a blend can be asked to supply, in deficit-column order
+BLEND_NUTRIENTS = ("N", "P", "K", "Zn", "B", "Fe")
+
+# Optimal bases kept for warm starts; in practice a few dozen cover all fields
+MAX_BASES = 64
+
+# Micronutrient -> (sensor reading key, critical level in ppm, corrective
+# dose in kg/ha of the element applied below it)
+MICRONUTRIENT_CRITICAL = {
+    "Zn": ("zinc", 0.6, 5.0),
+    "B": ("boron", 0.5, 1.0),
+    "Fe": ("iron", 4.5, 2.0),
+}
+
+
+def micronutrient_deficits(readings):
+    """{"Zn": kg/ha, ...} for the micronutrients of a sensor reading below their critical level."""
+    micronutrients = readings.get("micronutrients", readings)
+    return {
+        nutrient: dose if micronutrients.get(key, critical) < critical else 0.0
+        for nutrient, (key, critical, dose) in MICRONUTRIENT_CRITICAL.items()
+    }
+
+
+def field_deficits(nitrogen, phosphorus, potassium, crops, micronutrients=None):
+    """(n, len(BLEND_NUTRIENTS)) deficits: N/P/K from the crop targets, then ``micronutrients`` columns."""
+    npk, _ = calculate_fertilizer_requirements_batch(nitrogen, phosphorus, potassium, crops)
+    deficits = np.zeros((len(npk), len(BLEND_NUTRIENTS)))
+    deficits[:, :3] = npk
+    if micronutrients is not None:
+        deficits[:, 3:] = micronutrients
+    return deficits
+
+
+def load_prices_csv(path):
+    """FERTILIZER_PRICES-style dict from a CSV with product, brand and price (₹/kg) columns."""
+    prices = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            prices.setdefault(row["product"], {})[row["brand"]] = float(row["price"])
+    return prices
+
+
+class _Basis:
+    __slots__ = ("columns", "inverse")
+
+    def __init__(self, columns, inverse):
+        self.columns = columns
+        self.inverse = inverse
+
+
+class BlendOptimizer:
+    """Minimum-cost blends for ``prices`` ({product: {brand: ₹/kg}}).
+
+    ``brands`` restricts purchases to those brands; products without a
+    priced, allowed brand are left out.
+    """
+
+    def __init__(self, prices=None, brands=None, nutrients=BLEND_NUTRIENTS, tol=1e-9):
+        prices = FERTILIZER_PRICES if prices is None else prices
+        self.nutrients = tuple(nutrients)
+        self.tol = tol
+        self.products, self.brands, costs, grades = [], [], [], []
+        for category in FERTILIZERS.values():
+            for product, info in category.items():
+                offers = {brand: price for brand, price in prices.get(product, {}).items()
+                          if brands is None or brand in brands}
+                if not offers:
+                    continue
+                brand = min(offers, key=offers.get)
+                self.products.append(product)
+                self.brands.append(brand)
+                costs.append(offers[brand])
+                grades.append([info.get(n, 0) / 100 for n in self.nutrients])
+        self.costs = np.array(costs, dtype=np.float64)
+        # (nutrients, products) kg of nutrient per kg of product
+        self.grades = np.array(grades, dtype=np.float64).reshape(-1, len(self.nutrients)).T
+        # Standard form: grade · x - surplus = deficit, costs of surplus are 0
+        self._columns = np.hstack([self.grades, -np.eye(len(self.nutrients))])
+        self._column_costs = np.concatenate([self.costs, np.zeros(len(self.nutrients))])
+        self._bases = []
+        self.lp_solves = 0
+        self.basis_hits = 0
+        self._lock = threading.Lock()
+
+    def _check_supply(self, deficits):
+        unsupplied = (self.grades.sum(axis=1) == 0) & (deficits > 0).any(axis=0)
+        if unsupplied.any():
+            missing = [n for n, u in zip(self.nutrients, unsupplied) if u]
+            raise ValueError(f"No available product supplies {', '.join(missing)}")
+
+    def _solve_lp(self, deficit):
+        """Optimal quantities for one deficit vector, plus its optimal basis (or None)."""
+        from scipy.optimize import linprog
+
+        result = linprog(self.costs, A_ub=-self.grades, b_ub=-deficit, bounds=(0, None), method="highs")
+        if result.status != 0:
+            raise ValueError(f"Blend LP failed: {result.message}")
+        self.lp_solves += 1
+        return result.x, self._basis(result.x, deficit, -result.ineqlin.marginals)
+
+    def _basis(self, x, deficit, duals):
+        # Columns with zero reduced cost under the LP's duals; any nonsingular
+        # basis taken from them that contains the solution's support is
+        # optimal, and stays dual feasible for every other deficit
+        m = len(self.nutrients)
+        reduced = self._column_costs - duals @ self._columns
+        scale = max(1.0, float(np.abs(self._column_costs).max()))
+        if (reduced < -1e-7 * scale).any():
+            return None
+        values = np.concatenate([x, self.grades @ x - deficit])
+        support = np.flatnonzero(values > 1e-9 * max(1.0, float(deficit.max(initial=0))))
+        candidates = [j for j in np.argsort(reduced) if reduced[j] <= 1e-7 * scale and j not in support]
+        columns = []
+        for j in [*support, *candidates]:
+            trial = columns + [j]
+            if np.linalg.matrix_rank(self._columns[:, trial]) == len(trial):
+                columns = trial
+            if len(columns) == m:
+                break
+        if len(columns) < m:
+            return None
+        inverse = np.linalg.inv(self._columns[:, columns])
+        # Check the basis on its own: its duals must price every column
+        # non-negatively, and its basic solution must be feasible here
+        duals = self._column_costs[columns] @ inverse
+        if (self._column_costs - duals @ self._columns < -1e-7 * scale).any():
+            return None
+        if (inverse @ deficit < -1e-7 * max(1.0, float(deficit.max(initial=0)))).any():
+            return None
+        return _Basis(np.array(columns), inverse)
+
+    def _apply(self, basis, deficits):
+        # Basic solutions of every row; rows where they are all >= 0 are optimal
+        values = deficits @ basis.inverse.T
+        feasible = (values >= -self.tol * (1.0 + deficits.max(axis=1, initial=0))[:, None]).all(axis=1)
+        quantities = np.zeros((len(deficits), len(self._column_costs)))
+        quantities[:, basis.columns] = np.maximum(values, 0.0)
+        return feasible, quantities[:, :len(self.products)]
+
+    @timed("blend.solve_batch")
+    def solve_batch(self, deficits):
+        """Optimal blends for an (n, len(nutrients)) array of deficits in kg/ha.
+
+        Returns ``(quantities, costs)``: an (n, len(products)) array of kg/ha
+        of each product (bought from ``brands``) and the cost per ha of each.
+        """
+        deficits = np.maximum(np.asarray(deficits, dtype=np.float64).reshape(-1, len(self.nutrients)), 0.0)
+        self._check_supply(deficits)
+        quantities = np.zeros((len(deficits), len(self.products)))
+        unsolved = np.arange(len(deficits))
+        with self._lock:
+            bases = list(self._bases)
+        # Newest bases first
+        for basis in bases:
+            if not len(unsolved):
+                break
+            unsolved = self._assign(basis, deficits, quantities, unsolved)
+
+        while len(unsolved):
+            x, basis = self._solve_lp(deficits[unsolved[0]])
+            if basis is None:
+                # Degenerate optimum without a clean basis: keep this row's solution only
+                quantities[unsolved[0]] = x
+                unsolved = unsolved[1:]
+                continue
+            with self._lock:
+                self._bases.insert(0, basis)
+                del self._bases[MAX_BASES:]
+            unsolved = self._assign(basis, deficits, quantities, unsolved)
+        return quantities, quantities @ self.costs
+
+    def _assign(self, basis, deficits, quantities, unsolved):
+        feasible, solved = self._apply(basis, deficits[unsolved])
+        quantities[unsolved[feasible]] = solved[feasible]
+        self.basis_hits += int(feasible.sum())
+        return unsolved[~feasible]
+
+    def solve(self, deficit):
+        """Blend for one field: ``deficit`` maps nutrient -> kg/ha (missing nutrients are 0).
+
+        Returns {"cost": ₹/ha, "products": {product: {"brand", "kg_per_ha"}},
+        "supplied": {nutrient: kg/ha}}.
+        """
+        unknown = set(deficit) - set(self.nutrients)
+        if unknown:
+            raise ValueError(f"Unknown nutrient(s): {', '.join(sorted(unknown))}")
+        quantities, costs = self.solve_batch([[deficit.get(n, 0.0) for n in self.nutrients]])
+        supplied = self.grades @ quantities[0]
+        return {
+            "cost": round(float(costs[0]), 2),
+            "products": {product: {"brand": brand, "kg_per_ha": round(float(q), 1)}
+                         for product, brand, q in zip(self.products, self.brands, quantities[0]) if q > 1e-6},
+            "supplied": {n: round(float(s), 1) for n, s in zip(self.nutrients, supplied)},
+        }
+
+    def stats(self):
+        return {"bases": len(self._bases), "lp_solves": self.lp_solves, "basis_hits": self.basis_hits}
+
+
+_default_optimizer = None
+_default_lock = threading.Lock()
+
+
+def default_optimizer():
+    """Process-wide optimizer over FERTILIZER_PRICES, or the prices in FERTILIZER_PRICES_CSV."""
+    global _default_optimizer
+    with _default_lock:
+        if _default_optimizer is None:
+            path = os.environ.get("FERTILIZER_PRICES_CSV")
+            _default_optimizer = BlendOptimizer(load_prices_csv(path) if path else None)
+        return _default_optimizer
+
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Least-cost fertilizer blends for many fields.")
+    parser.add_argument("fields", help="CSV with crop, N, P, K columns (soil ppm) and optional "
+                                       "zinc, boron, iron columns (ppm)")
+    parser.add_argument("-o", "--output", help="output CSV (default: stdout)")
+    parser.add_argument("--prices", default=os.environ.get("FERTILIZER_PRICES_CSV"),
+                        help="CSV of product, brand, price (default: FERTILIZER_PRICES_CSV or built-in prices)")
+    parser.add_argument("--brand", action="append", dest="brands", help="only buy from this brand (repeatable)")
+    args = parser.parse_args(argv)
+
+    fields = pd.read_csv(args.fields)
+    unknown = sorted(set(fields["crop"]) - set(CROP_NAMES))
+    if unknown:
+        parser.error(f"unknown crop(s): {', '.join(map(str, unknown))}")
+    micronutrients = np.column_stack([
+        np.where(fields[key] < critical, dose, 0.0) if key in fields else np.zeros(len(fields))
+        for key, critical, dose in MICRONUTRIENT_CRITICAL.values()
+    ])
+    optimizer = BlendOptimizer(load_prices_csv(args.prices) if args.prices else None, args.brands)
+    deficits = field_deficits(fields["N"], fields["P"], fields["K"], fields["crop"], micronutrients)
+    quantities, costs = optimizer.solve_batch(deficits)
+
+    result = fields.copy()
+    for j, product in enumerate(optimizer.products):
+        result[f"{product} ({optimizer.brands[j]}) kg/ha"] = quantities[:, j].round(1)
+    result["cost_per_ha"] = costs.round(2)
+    result.to_csv(args.output or sys.stdout, index=False)
+    stats = optimizer.stats()
+    print(f"Solved {len(result)} fields with {stats['lp_solves']} LP solves", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
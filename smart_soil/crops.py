@@ -0,0 +1,159 @@
+"""Crop and fertilizer catalogs."""
+
+# Extended Crop database with more crops and details
+CROPS = {
+    "Rice": {
+        "N": 120, "P": 60, "K": 60, "pH": (5.5, 6.5),
+        "growth_stages": ["Seedling", "Tillering", "Panicle Initiation", "Flowering", "Grain Filling"],
+        "water_requirement": "High",
+        "temperature_range": (20, 35),
+        "season": ["Kharif", "Rabi"],
+        "varieties": ["Basmati", "Non-Basmati", "Hybrid"],
+        "yield_potential": "4-6 tons/ha"
+    },
+    "Wheat": {
+        "N": 100, "P": 50, "K": 50, "pH": (6.0, 7.0),
+        "growth_stages": ["Germination", "Tillering", "Stem Elongation", "Heading", "Ripening"],
+        "water_requirement": "Medium",
+        "temperature_range": (15, 25),
+        "season": ["Rabi"],
+        "varieties": ["Durum", "Bread Wheat", "Emmer"],
+        "yield_potential": "3-5 tons/ha"
+    },
+    "Maize": {
+        "N": 120, "P": 60, "K": 60, "pH": (5.8, 7.0),
+        "growth_stages": ["Germination", "Vegetative", "Tasseling", "Silking", "Maturity"],
+        "water_requirement": "Medium",
+        "temperature_range": (18, 32),
+        "season": ["Kharif", "Rabi"],
+        "varieties": ["Sweet Corn", "Field Corn", "Popcorn"],
+        "yield_potential": "5-8 tons/ha"
+    },
+    "Soybean": {
+        "N": 20, "P": 60, "K": 80, "pH": (6.0, 7.0),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Pod Development", "Maturity"],
+        "water_requirement": "Medium",
+        "temperature_range": (20, 30),
+        "season": ["Kharif"],
+        "varieties": ["Black", "Yellow", "Green"],
+        "yield_potential": "2-3 tons/ha"
+    },
+    "Cotton": {
+        "N": 100, "P": 50, "K": 50, "pH": (5.8, 6.5),
+        "growth_stages": ["Germination", "Vegetative", "Square Formation", "Flowering", "Boll Development"],
+        "water_requirement": "Medium",
+        "temperature_range": (20, 35),
+        "season": ["Kharif"],
+        "varieties": ["Upland", "Pima", "Egyptian"],
+        "yield_potential": "2-3 bales/ha"
+    },
+    "Potato": {
+        "N": 120, "P": 60, "K": 120, "pH": (5.0, 6.0),
+        "growth_stages": ["Sprouting", "Vegetative", "Tuber Initiation", "Tuber Bulking", "Maturity"],
+        "water_requirement": "High",
+        "temperature_range": (15, 25),
+        "season": ["Rabi"],
+        "varieties": ["Russet", "Red", "White"],
+        "yield_potential": "20-30 tons/ha"
+    },
+    "Tomato": {
+        "N": 100, "P": 50, "K": 150, "pH": (5.5, 6.8),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Fruit Setting", "Harvesting"],
+        "water_requirement": "Medium",
+        "temperature_range": (20, 30),
+        "season": ["Kharif", "Rabi"],
+        "varieties": ["Cherry", "Beefsteak", "Roma"],
+        "yield_potential": "40-60 tons/ha"
+    },
+    "Sugarcane": {
+        "N": 200, "P": 100, "K": 200, "pH": (6.0, 7.5),
+        "growth_stages": ["Germination", "Tillering", "Grand Growth", "Maturity"],
+        "water_requirement": "High",
+        "temperature_range": (20, 35),
+        "season": ["Kharif"],
+        "varieties": ["Early", "Mid", "Late"],
+        "yield_potential": "80-100 tons/ha"
+    },
+    "Millets": {
+        "N": 60, "P": 30, "K": 30, "pH": (6.0, 7.5),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Grain Formation"],
+        "water_requirement": "Low",
+        "temperature_range": (20, 35),
+        "season": ["Kharif"],
+        "varieties": ["Pearl", "Finger", "Foxtail"],
+        "yield_potential": "1.5-2.5 tons/ha"
+    },
+    "Pulses": {
+        "N": 20, "P": 40, "K": 20, "pH": (6.0, 7.5),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Pod Formation"],
+        "water_requirement": "Low",
+        "temperature_range": (20, 30),
+        "season": ["Rabi"],
+        "varieties": ["Chickpea", "Lentil", "Pigeon Pea"],
+        "yield_potential": "1-2 tons/ha"
+    },
+    "Oilseeds": {
+        "N": 40, "P": 20, "K": 20, "pH": (6.0, 7.0),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Pod Formation"],
+        "water_requirement": "Low",
+        "temperature_range": (20, 30),
+        "season": ["Kharif", "Rabi"],
+        "varieties": ["Mustard", "Sunflower", "Groundnut"],
+        "yield_potential": "1.5-2.5 tons/ha"
+    },
+    "Vegetables": {
+        "N": 80, "P": 40, "K": 60, "pH": (6.0, 7.0),
+        "growth_stages": ["Germination", "Vegetative", "Flowering", "Fruit Setting"],
+        "water_requirement": "High",
+        "temperature_range": (15, 30),
+        "season": ["Kharif", "Rabi"],
+        "varieties": ["Leafy", "Root", "Fruit"],
+        "yield_potential": "20-30 tons/ha"
+    }
+}
+
+# Extended Fertilizer database with more brands and types. Grades are % by
+# weight; products are listed under their main nutrient but carry every
+# nutrient they supply (DAP is 18-46-0)
+FERTILIZERS = {
+    "Nitrogen": {
+        "Urea": {"N": 46, "brands": ["IFFCO", "KRIBHCO", "Nagarjuna", "Chambal", "Tata", "Coromandel"]},
+        "Ammonium Nitrate": {"N": 34, "brands": ["Coromandel", "Zuari", "GSFC", "RCF"]},
+        "Ammonium Sulfate": {"N": 21, "brands": ["RCF", "GSFC", "IFFCO"]},
+        "Calcium Ammonium Nitrate": {"N": 26, "brands": ["Yara", "Haifa", "ICL"]}
+    },
+    "Phosphorus": {
+        "DAP": {"N": 18, "P": 46, "brands": ["IFFCO", "Coromandel", "Zuari", "Paradeep", "RCF"]},
+        "SSP": {"P": 16, "brands": ["RCF", "GSFC", "IFFCO", "Coromandel"]},
+        "Rock Phosphate": {"P": 30, "brands": ["Paradeep", "Jhamarkotra", "RSMML"]},
+        "NPK Complex": {"N": 20, "P": 20, "K": 20, "brands": ["IFFCO", "Coromandel", "Zuari"]}
+    },
+    "Potassium": {
+        "MOP": {"K": 60, "brands": ["IPL", "Zuari", "Coromandel", "IFFCO"]},
+        "SOP": {"K": 50, "brands": ["IFFCO", "KRIBHCO", "Yara"]},
+        "Potassium Nitrate": {"N": 13, "K": 44, "brands": ["Yara", "Haifa", "ICL"]}
+    },
+    "Micronutrients": {
+        "Zinc Sulfate": {"Zn": 21, "brands": ["Coromandel", "Zuari", "IFFCO"]},
+        "Boron": {"B": 11, "brands": ["Yara", "Haifa", "ICL"]},
+        "Iron Chelate": {"Fe": 12, "brands": ["Yara", "Haifa", "ICL"]}
+    }
+}
+
+# Indicative retail prices in ₹/kg of product, per brand
+FERTILIZER_PRICES = {
+    "Urea": {"IFFCO": 5.9, "KRIBHCO": 5.9, "Nagarjuna": 6.1, "Chambal": 6.0, "Tata": 6.2, "Coromandel": 6.3},
+    "Ammonium Nitrate": {"Coromandel": 31.0, "Zuari": 30.5, "GSFC": 29.8, "RCF": 30.2},
+    "Ammonium Sulfate": {"RCF": 19.5, "GSFC": 20.0, "IFFCO": 19.8},
+    "Calcium Ammonium Nitrate": {"Yara": 27.0, "Haifa": 28.5, "ICL": 27.8},
+    "DAP": {"IFFCO": 27.0, "Coromandel": 27.5, "Zuari": 27.2, "Paradeep": 27.0, "RCF": 27.4},
+    "SSP": {"RCF": 10.5, "GSFC": 10.2, "IFFCO": 10.8, "Coromandel": 11.0},
+    "Rock Phosphate": {"Paradeep": 8.5, "Jhamarkotra": 7.8, "RSMML": 8.0},
+    "NPK Complex": {"IFFCO": 29.5, "Coromandel": 30.0, "Zuari": 29.8},
+    "MOP": {"IPL": 34.0, "Zuari": 34.5, "Coromandel": 35.0, "IFFCO": 34.2},
+    "SOP": {"IFFCO": 72.0, "KRIBHCO": 70.0, "Yara": 78.0},
+    "Potassium Nitrate": {"Yara": 145.0, "Haifa": 150.0, "ICL": 142.0},
+    "Zinc Sulfate": {"Coromandel": 62.0, "Zuari": 60.0, "IFFCO": 58.0},
+    "Boron": {"Yara": 110.0, "Haifa": 115.0, "ICL": 105.0},
+    "Iron Chelate": {"Yara": 350.0, "Haifa": 380.0, "ICL": 360.0},
+}
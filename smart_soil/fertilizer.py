@@ -0,0 +1,112 @@
+"""Fertilizer requirement calculations, scalar and columnar.
+
+The scalar path is pure Python; numpy and the array tables (CROP_NPK,
+PRODUCT_NUTRIENT, PRODUCT_GRADE) are set up on first columnar use.
+"""
+import functools
+
+from smart_soil.crops import CROPS, FERTILIZERS
+from smart_soil.metrics import timed
+
+# Nutrients covered by the recommendation and the catalog section holding
+# the straight fertilizers for each of them
+NUTRIENTS = ("N", "P", "K")
+NUTRIENT_CATEGORIES = {"N": "Nitrogen", "P": "Phosphorus", "K": "Potassium"}
+
+# Sensor reading keys for each nutrient
+READING_KEYS = {"N": "nitrogen", "P": "phosphorus", "K": "potassium"}
+
+CROP_NAMES = list(CROPS)
+CROP_INDEX = {name: i for i, name in enumerate(CROP_NAMES)}
+
+
+def _product_table():
+    # One entry per product: (category, product, nutrient index, grade as a fraction)
+    table = []
+    for i, nutrient in enumerate(NUTRIENTS):
+        category = NUTRIENT_CATEGORIES[nutrient]
+        for product, info in FERTILIZERS[category].items():
+            table.append((category, product, i, info[nutrient] / 100))
+    return table
+
+
+PRODUCTS = _product_table()
+PRODUCT_NAMES = [product for _, product, _, _ in PRODUCTS]
+
+
+@functools.cache
+def _tables():
+    import numpy as np
+
+    return {
+        # Crop nutrient targets as an (n_crops, 3) array in NUTRIENTS order
+        "CROP_NPK": np.array([[CROPS[name][n] for n in NUTRIENTS] for name in CROP_NAMES], dtype=np.float64),
+        # Nutrient index and grade of every product in PRODUCT_NAMES
+        "PRODUCT_NUTRIENT": np.array([i for _, _, i, _ in PRODUCTS], dtype=np.intp),
+        "PRODUCT_GRADE": np.array([grade for _, _, _, grade in PRODUCTS], dtype=np.float64),
+    }
+
+
+def __getattr__(name):
+    try:
+        return _tables()[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+# Function to calculate fertilizer requirements with specific recommendations
+@timed("fertilizer.requirements")
+def calculate_fertilizer_requirements(soil_readings, crop_type):
+    crop_needs = CROPS[crop_type]
+    recommendations = {
+        n: max(0, crop_needs[n] - soil_readings[READING_KEYS[n]]) for n in NUTRIENTS
+    }
+
+    # Calculate specific fertilizer amounts
+    fertilizer_details = {category: {} for category in NUTRIENT_CATEGORIES.values()}
+    for category, product, i, grade in PRODUCTS:
+        fertilizer_details[category][product] = round(recommendations[NUTRIENTS[i]] / grade, 1)
+
+    return recommendations, fertilizer_details
+
+
+def crop_ids(crops):
+    """Map crop names (or pass through integer ids) to indices into CROP_NAMES."""
+    import numpy as np
+
+    crops = np.asarray(crops)
+    if crops.dtype.kind in "iu":
+        if crops.size and (crops.min() < 0 or crops.max() >= len(CROP_NAMES)):
+            raise ValueError("Crop id out of range")
+        return crops.astype(np.intp, copy=False)
+
+    names, inverse = np.unique(crops.astype(str), return_inverse=True)
+    unknown = [name for name in names if name not in CROP_INDEX]
+    if unknown:
+        raise ValueError(f"Unknown crop type(s): {', '.join(unknown)}")
+    lookup = np.array([CROP_INDEX[name] for name in names], dtype=np.intp)
+    return lookup[inverse.reshape(crops.shape)]
+
+
+@timed("fertilizer.requirements_batch")
+def calculate_fertilizer_requirements_batch(nitrogen, phosphorus, potassium, crops):
+    """Columnar ``calculate_fertilizer_requirements`` for whole soil grids.
+
+    ``nitrogen``, ``phosphorus`` and ``potassium`` are arrays of readings and
+    ``crops`` holds a crop name or CROP_NAMES index per row (or a single one
+    for all rows). Returns ``(deficits, quantities)``: an (n, 3) array of
+    N/P/K deficits in kg/ha and an (n, len(PRODUCT_NAMES)) array with the
+    kg/ha of each product that would cover its nutrient's deficit.
+    """
+    import numpy as np
+
+    tables = _tables()
+    soil = np.column_stack([
+        np.asarray(nitrogen, dtype=np.float64),
+        np.asarray(phosphorus, dtype=np.float64),
+        np.asarray(potassium, dtype=np.float64),
+    ])
+    needs = tables["CROP_NPK"][crop_ids(crops)]
+    deficits = np.maximum(needs - soil, 0.0)
+    quantities = np.round(deficits[:, tables["PRODUCT_NUTRIENT"]] / tables["PRODUCT_GRADE"], 1)
+    return deficits, quantities
@@ -0,0 +1,137 @@
+"""Plotly figure builders for the dashboard tabs.
+
+Pure functions of their data, so they can be cached (see render_cache) and
+timed without a Streamlit session.
+"""
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from smart_soil.metrics import timed
+
+# Readings shown as gauges; only these key the cached gauge figure
+SOIL_GAUGE_KEYS = ['pH', 'moisture', 'organic_matter', 'nitrogen', 'phosphorus', 'potassium']
+
+
+# Function to build the soil parameter gauge charts
+@timed("figure.soil_gauges")
+def build_soil_gauges(readings):
+    fig_soil = make_subplots(rows=2, cols=3,
+                           specs=[[{'type': 'indicator'}, {'type': 'indicator'}, {'type': 'indicator'}],
+                                 [{'type': 'indicator'}, {'type': 'indicator'}, {'type': 'indicator'}]])
+    
+    # Add gauges for key parameters
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['pH'],
+        title={'text': "pH Level"},
+        gauge={'axis': {'range': [5, 8]},
+              'bar': {'color': "darkblue"}}),
+        row=1, col=1)
+    
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['moisture'],
+        title={'text': "Moisture %"},
+        gauge={'axis': {'range': [0, 100]},
+              'bar': {'color': "green"}}),
+        row=1, col=2)
+    
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['organic_matter'],
+        title={'text': "Organic Matter %"},
+        gauge={'axis': {'range': [0, 5]},
+              'bar': {'color': "brown"}}),
+        row=1, col=3)
+    
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['nitrogen'],
+        title={'text': "Nitrogen (ppm)"},
+        gauge={'axis': {'range': [0, 100]},
+              'bar': {'color': "blue"}}),
+        row=2, col=1)
+    
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['phosphorus'],
+        title={'text': "Phosphorus (ppm)"},
+        gauge={'axis': {'range': [0, 100]},
+              'bar': {'color': "purple"}}),
+        row=2, col=2)
+    
+    fig_soil.add_trace(go.Indicator(
+        mode="gauge+number",
+        value=readings['potassium'],
+        title={'text': "Potassium (ppm)"},
+        gauge={'axis': {'range': [0, 100]},
+              'bar': {'color': "orange"}}),
+        row=2, col=3)
+    
+    fig_soil.update_layout(height=400, showlegend=False)
+    return fig_soil
+
+
+# Function to build the weather forecast charts
+@timed("figure.weather")
+def build_weather_figure(forecast_df):
+    fig_weather = make_subplots(rows=2, cols=2,
+                              subplot_titles=("Temperature & Rainfall", "Humidity & Pressure",
+                                            "Wind Speed & Direction", "Weather Conditions"))
+    
+    # Add traces for each parameter
+    fig_weather.add_trace(go.Scatter(x=forecast_df['date'], y=forecast_df['temperature'],
+                                  name='Temperature', line=dict(color='red')), row=1, col=1)
+    fig_weather.add_trace(go.Bar(x=forecast_df['date'], y=forecast_df['rainfall'],
+                              name='Rainfall'), row=1, col=1)
+    
+    fig_weather.add_trace(go.Scatter(x=forecast_df['date'], y=forecast_df['humidity'],
+                                  name='Humidity', line=dict(color='blue')), row=1, col=2)
+    fig_weather.add_trace(go.Scatter(x=forecast_df['date'], y=forecast_df['pressure'],
+                                  name='Pressure', line=dict(color='green')), row=1, col=2)
+    
+    fig_weather.add_trace(go.Scatter(x=forecast_df['date'], y=forecast_df['wind_speed'],
+                                  name='Wind Speed', line=dict(color='purple')), row=2, col=1)
+    
+    # Add weather icons
+    weather_icons = []
+    for icon in forecast_df['icon']:
+        weather_icons.append(f"https://openweathermap.org/img/wn/{icon}@2x.png")
+    
+    fig_weather.add_trace(go.Scatter(x=forecast_df['date'], y=[0]*len(forecast_df),
+                                  name='Weather', mode='markers',
+                                  marker=dict(size=20, symbol='circle'),
+                                  hovertext=forecast_df['description']), row=2, col=2)
+    
+    fig_weather.update_layout(height=600, showlegend=True)
+    return fig_weather
+
+
+# Function to build the historical trend charts
+@timed("figure.history")
+def build_history_figure(historical_data):
+    fig_history = make_subplots(rows=2, cols=2,
+                               subplot_titles=("Yield Trend", "Climate Data",
+                                             "Soil Parameters", "Economic Indicators"))
+    
+    # Add traces for each parameter
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Yield'],
+                                    name='Yield', line=dict(color='green')), row=1, col=1)
+    
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Rainfall'],
+                                    name='Rainfall', line=dict(color='blue')), row=1, col=2)
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Temperature'],
+                                    name='Temperature', line=dict(color='red')), row=1, col=2)
+    
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Soil_Moisture'],
+                                    name='Soil Moisture', line=dict(color='brown')), row=2, col=1)
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Soil_pH'],
+                                    name='Soil pH', line=dict(color='purple')), row=2, col=1)
+    
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Market_Price'],
+                                    name='Market Price', line=dict(color='orange')), row=2, col=2)
+    fig_history.add_trace(go.Scatter(x=historical_data['Date'], y=historical_data['Labor_Cost'],
+                                    name='Labor Cost', line=dict(color='gray')), row=2, col=2)
+    
+    fig_history.update_layout(height=800, showlegend=True)
+    return fig_history
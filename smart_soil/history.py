@@ -0,0 +1,156 @@
+"""Per-crop monthly rollups of farm history.
+
+Rollups keep, for every crop and calendar month, the sum/min/max/count of
+each metric, plus running totals per crop. Appending a record updates one
+month row and the totals in place, so the Historical Data tab reads monthly
+means and overall averages without scanning raw history.
+"""
+import bisect
+import os
+import random
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+METRICS = ["Yield", "Rainfall", "Temperature", "Fertilizer_Used", "Soil_Moisture", "Soil_pH",
+           "Pest_Incidence", "Disease_Incidence", "Market_Price", "Labor_Cost"]
+STATISTICS = ("mean", "min", "max", "count")
+
+
+# Function to generate historical data with more parameters
+def generate_historical_data(crop_type):
+    dates = pd.date_range(end=datetime.now(), periods=12, freq='M')
+    data = {
+        'Date': dates,
+        'Yield': [random.uniform(2.0, 4.0) for _ in range(12)],
+        'Rainfall': [random.uniform(0, 200) for _ in range(12)],
+        'Temperature': [random.uniform(15, 35) for _ in range(12)],
+        'Fertilizer_Used': [random.uniform(100, 300) for _ in range(12)],
+        'Soil_Moisture': [random.uniform(30, 70) for _ in range(12)],
+        'Soil_pH': [random.uniform(5.0, 8.0) for _ in range(12)],
+        'Pest_Incidence': [random.uniform(0, 100) for _ in range(12)],
+        'Disease_Incidence': [random.uniform(0, 100) for _ in range(12)],
+        'Market_Price': [random.uniform(1000, 5000) for _ in range(12)],
+        'Labor_Cost': [random.uniform(500, 2000) for _ in range(12)]
+    }
+    return pd.DataFrame(data)
+
+
+class _CropRollup:
+    def __init__(self, n_metrics):
+        self.months = []            # sorted month numbers (months since 1970-01)
+        self.rows = {}              # month number -> row in the arrays below
+        self.sum = np.zeros((0, n_metrics))
+        self.min = np.zeros((0, n_metrics))
+        self.max = np.zeros((0, n_metrics))
+        self.count = np.zeros((0, n_metrics), dtype=np.int64)
+        self.total_sum = np.zeros(n_metrics)
+        self.total_count = np.zeros(n_metrics, dtype=np.int64)
+
+    def row(self, month):
+        row = self.rows.get(month)
+        if row is None:
+            row = len(self.rows)
+            self.rows[month] = row
+            bisect.insort(self.months, month)
+            n = self.sum.shape[1]
+            self.sum = np.vstack([self.sum, np.zeros(n)])
+            self.min = np.vstack([self.min, np.full(n, np.inf)])
+            self.max = np.vstack([self.max, np.full(n, -np.inf)])
+            self.count = np.vstack([self.count, np.zeros(n, dtype=np.int64)])
+        return row
+
+
+class HistoryRollup:
+    def __init__(self, metrics=METRICS):
+        self.metrics = list(metrics)
+        self._crops = {}
+        self._lock = threading.Lock()
+
+    def crops(self):
+        return list(self._crops)
+
+    def append(self, crop, date, values):
+        """Fold one record ({metric: value}, missing metrics skipped) into its month."""
+        month = int(np.datetime64(pd.Timestamp(date), "M").astype(np.int64))
+        vector = np.array([values.get(m, np.nan) for m in self.metrics], dtype=np.float64)
+        present = ~np.isnan(vector)
+        with self._lock:
+            rollup = self._crops.setdefault(crop, _CropRollup(len(self.metrics)))
+            row = rollup.row(month)
+            rollup.sum[row, present] += vector[present]
+            rollup.min[row, present] = np.minimum(rollup.min[row, present], vector[present])
+            rollup.max[row, present] = np.maximum(rollup.max[row, present], vector[present])
+            rollup.count[row, present] += 1
+            rollup.total_sum[present] += vector[present]
+            rollup.total_count[present] += 1
+
+    def append_frame(self, crop, frame, date_column="Date"):
+        for record in frame.to_dict("records"):
+            self.append(crop, record[date_column], record)
+
+    def means(self, crop):
+        """Overall average of every metric for ``crop``, from the running totals."""
+        rollup = self._crops.get(crop)
+        if rollup is None:
+            return {m: np.nan for m in self.metrics}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = rollup.total_sum / rollup.total_count
+        return dict(zip(self.metrics, averages))
+
+    def monthly(self, crop, last=12, statistic="mean"):
+        """Last ``last`` months of ``crop`` as a DataFrame indexed like generate_historical_data.
+
+        ``Date`` is the month end; metric columns hold the chosen statistic.
+        """
+        if statistic not in STATISTICS:
+            raise ValueError(f"statistic must be one of {', '.join(STATISTICS)}")
+        rollup = self._crops.get(crop)
+        if rollup is None:
+            return pd.DataFrame(columns=["Date"] + self.metrics)
+        with self._lock:
+            months = rollup.months[-last:] if last else list(rollup.months)
+            rows = [rollup.rows[m] for m in months]
+            if statistic == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    values = rollup.sum[rows] / rollup.count[rows]
+            else:
+                values = getattr(rollup, statistic)[rows].astype(np.float64)
+                if statistic != "count":
+                    values[rollup.count[rows] == 0] = np.nan
+        frame = pd.DataFrame(values, columns=self.metrics)
+        month_starts = pd.to_datetime(np.array(months, dtype="datetime64[M]"))
+        frame.insert(0, "Date", month_starts + pd.offsets.MonthEnd(0))
+        return frame
+
+
+def load_history_csv(rollup, path):
+    """Fold a CSV with Crop, Date and metric columns into ``rollup``."""
+    frame = pd.read_csv(path, parse_dates=["Date"])
+    for crop, records in frame.groupby("Crop"):
+        rollup.append_frame(crop, records)
+
+
+_default_rollup = None
+_default_lock = threading.Lock()
+
+
+def default_rollup(crops=()):
+    """Process-wide rollup.
+
+    Loaded from CROP_HISTORY_CSV when set; otherwise each of ``crops`` is
+    seeded once with a simulated year from generate_historical_data.
+    """
+    global _default_rollup
+    with _default_lock:
+        if _default_rollup is None:
+            _default_rollup = HistoryRollup()
+            if os.environ.get("CROP_HISTORY_CSV"):
+                load_history_csv(_default_rollup, os.environ["CROP_HISTORY_CSV"])
+        if not os.environ.get("CROP_HISTORY_CSV"):
+            for crop in crops:
+                if crop not in _default_rollup.crops():
+                    _default_rollup.append_frame(crop, generate_historical_data(crop))
+        return _default_rollup
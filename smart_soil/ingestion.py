@@ -0,0 +1,278 @@
+"""Streaming ingestion of soil probe readings.
+
+Probes push readings (same schema as ``get_sensor_readings``) to a source:
+newline-delimited JSON over TCP, one JSON object per UDP datagram, or the
+built-in simulator. Every source publishes into a ``SensorStream``, which
+keeps the most recent readings in a bounded ring buffer and hands them to
+consumers through ``latest()``, ``recent()`` and the blocking ``follow()``
+generator.
+"""
+import json
+import logging
+import math
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from smart_soil.sensors import get_sensor_readings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 4096
+DEFAULT_INTERVAL = 5.0
+
+# Keys every reading must carry; micronutrients is a nested dict
+READING_KEYS = ("pH", "nitrogen", "phosphorus", "potassium", "moisture", "temperature", "humidity",
+                "organic_matter", "ec", "soil_type", "micronutrients")
+MICRONUTRIENT_KEYS = ("zinc", "iron", "manganese", "copper", "boron")
+# Keys holding numbers; all but soil_type and micronutrients
+NUMERIC_KEYS = tuple(k for k in READING_KEYS if k not in ("soil_type", "micronutrients"))
+
+
+def _finite(value, key):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{key} is not a finite number")
+    return value
+
+
+def normalize_reading(reading, sensor_id=None):
+    """Validate a reading and stamp it with ``timestamp`` and ``sensor_id``.
+
+    Numeric channels are converted to float and must be finite; ValueError
+    or TypeError is raised otherwise.
+    """
+    missing = [k for k in READING_KEYS if k not in reading]
+    if missing:
+        raise ValueError(f"Reading is missing {', '.join(missing)}")
+    missing = [k for k in MICRONUTRIENT_KEYS if k not in reading["micronutrients"]]
+    if missing:
+        raise ValueError(f"Reading is missing micronutrients {', '.join(missing)}")
+    reading = dict(reading)
+    for key in NUMERIC_KEYS:
+        reading[key] = _finite(reading[key], key)
+    reading["micronutrients"] = {k: _finite(v, k) if k in MICRONUTRIENT_KEYS else v
+                                 for k, v in reading["micronutrients"].items()}
+    reading.setdefault("timestamp", time.time())
+    reading.setdefault("sensor_id", sensor_id or "default")
+    return reading
+
+
+class RingBuffer:
+    """Bounded, thread-safe buffer of (sequence number, item) pairs."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._items = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def append(self, item):
+        with self._cond:
+            self._seq += 1
+            self._items.append((self._seq, item))
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self):
+        with self._cond:
+            return self._items[-1] if self._items else (0, None)
+
+    def since(self, seq):
+        # Items newer than ``seq`` still in the buffer (older ones were overwritten)
+        with self._cond:
+            return [(s, item) for s, item in self._items if s > seq]
+
+    def wait(self, seq, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+            return self._seq > seq
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SensorStream:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.buffer = RingBuffer(capacity)
+        self.sources = []
+        self.dropped = 0
+        self._subscribers = []
+
+    def publish(self, reading, sensor_id=None):
+        try:
+            reading = normalize_reading(reading, sensor_id)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._drop("Dropping malformed reading: %s", e)
+            return None
+        seq = self.buffer.append(reading)
+        for callback in self._subscribers:
+            # A failing subscriber must not take the source thread down with it
+            try:
+                callback(reading)
+            except Exception:
+                logger.exception("Sensor stream subscriber %r failed", callback)
+        return seq
+
+    def _drop(self, message, *args):
+        with self.buffer._cond:
+            self.dropped += 1
+        logger.warning(message, *args)
+
+    def subscribe(self, callback):
+        # ``callback(reading)`` runs on the source thread for every reading.
+        # Copy on write, so publish() can iterate without a lock
+        self._subscribers = [*self._subscribers, callback]
+
+    def latest(self):
+        return self.buffer.latest()[1]
+
+    def recent(self, n=None):
+        items = [item for _, item in self.buffer.since(0)]
+        return items if n is None else items[-n:]
+
+    def follow(self, from_seq=None, timeout=None):
+        """Yield readings as they arrive.
+
+        Starts after the current newest reading (or after ``from_seq``) and
+        stops when no reading arrives within ``timeout`` seconds.
+        """
+        seq = self.buffer.seq if from_seq is None else from_seq
+        while True:
+            if not self.buffer.wait(seq, timeout):
+                return
+            for seq, reading in self.buffer.since(seq):
+                yield reading
+
+    __iter__ = follow
+
+    def add_source(self, source):
+        self.sources.append(source)
+        source.start(self)
+        return source
+
+    def close(self):
+        for source in self.sources:
+            source.stop()
+        self.sources.clear()
+
+
+class SimulatedSource:
+    """Stand-in for real probes: publishes ``read()`` every ``interval`` seconds."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, read=get_sensor_readings, sensor_id="simulator"):
+        self.interval = interval
+        self.read = read
+        self.sensor_id = sensor_id
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, stream):
+        def run():
+            while not self._stop.is_set():
+                stream.publish(self.read(), self.sensor_id)
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name="sensor-simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class _SocketSource:
+    server_class = None
+    handler_class = None
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+
+    @property
+    def address(self):
+        return self.server.server_address if self.server else (self.host, self.port)
+
+    def start(self, stream):
+        self.server = self.server_class((self.host, self.port), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.stream = stream
+        threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        _publish_line(self.server.stream, self.request[0], self.client_address)
+
+
+class _TCPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                _publish_line(self.server.stream, line, self.client_address)
+
+
+def _publish_line(stream, line, client_address):
+    try:
+        reading = json.loads(line)
+    except ValueError:
+        stream._drop("Dropping non-JSON reading from %s", client_address[0])
+        return
+    stream.publish(reading, reading.get("sensor_id") if isinstance(reading, dict) else None)
+
+
+class UDPSource(_SocketSource):
+    """One JSON reading per datagram."""
+    server_class = socketserver.ThreadingUDPServer
+    handler_class = _UDPHandler
+
+
+class TCPSource(_SocketSource):
+    """Newline-delimited JSON readings over persistent TCP connections."""
+    server_class = socketserver.ThreadingTCPServer
+    handler_class = _TCPHandler
+
+
+def source_from_url(url):
+    """``simulator[://?interval=N]``, ``udp://host:port`` or ``tcp://host:port``."""
+    parsed = urlparse(url if "://" in url else f"{url}://")
+    if parsed.scheme == "simulator":
+        params = dict(p.split("=", 1) for p in parsed.query.split("&") if "=" in p)
+        return SimulatedSource(interval=float(params.get("interval", DEFAULT_INTERVAL)))
+    if parsed.scheme == "udp":
+        return UDPSource(parsed.hostname or "0.0.0.0", parsed.port or 0)
+    if parsed.scheme == "tcp":
+        return TCPSource(parsed.hostname or "0.0.0.0", parsed.port or 0)
+    raise ValueError(f"Unknown sensor source: {url}")
+
+
+_default_stream = None
+_default_lock = threading.Lock()
+
+
+def default_stream():
+    """Process-wide stream fed by the sources listed in SENSOR_SOURCES.
+
+    SENSOR_SOURCES is a comma-separated list of source URLs and defaults to
+    the simulator.
+    """
+    global _default_stream
+    with _default_lock:
+        if _default_stream is None:
+            stream = SensorStream(int(os.environ.get("SENSOR_BUFFER_SIZE", DEFAULT_CAPACITY)))
+            for url in os.environ.get("SENSOR_SOURCES", "simulator").split(","):
+                stream.add_source(source_from_url(url.strip()))
+            _default_stream = stream
+        return _default_stream
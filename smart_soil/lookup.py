@@ -0,0 +1,312 @@
+"""Precomputed recommendation lookup table over the sensor domain.
+
+The forest only ever compares a feature against its split thresholds, so
+all inputs falling between the same pair of consecutive thresholds, on every
+feature, get the same prediction. The table keeps one cell per such
+threshold bin that a sensor grid value can land in (pH 5.0-8.0 and
+moisture 30-70 in steps of 0.1, N/P/K 20-100): a few million cells instead
+of the ~6.6e9 grid points, holding the predicted class and its confidence.
+Deficits and product quantities for every crop and N/P/K grid value are
+tabulated next to it. Serving a recommendation is then a handful of
+``searchsorted`` calls into ~60-entry threshold arrays and array indexing,
+with no model call.
+
+Every build lives in its own subdirectory, named after the model version
+and a hash of the crop and fertilizer tables, and ``current.json`` points
+at the live one. Readers memory-map the arrays. ``AutoLookup`` notices a new
+model artifact or edited crop tables and rebuilds in the background,
+answering ``None`` (fall back to the model) until the new table is ready.
+
+    python -m smart_soil.lookup fertilizer_lookup [--model fertilizer_model.pkl]
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from smart_soil.crops import CROPS, FERTILIZERS
+from smart_soil.fertilizer import (CROP_INDEX, CROP_NPK, NUTRIENT_CATEGORIES, NUTRIENTS, PRODUCT_GRADE,
+                                   PRODUCT_NUTRIENT, PRODUCTS)
+from smart_soil.forest import write_atomic
+from smart_soil.model_registry import default_model_path, get_model, get_model_version
+from smart_soil.predict import FEATURES, feature_matrix, predict_proba_batch
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+POINTER_FILE = "current.json"
+
+# (low, high, step) of every feature as reported by the probes
+SENSOR_DOMAIN = {
+    "pH": (5.0, 8.0, 0.1),
+    "N": (20, 100, 1),
+    "P": (20, 100, 1),
+    "K": (20, 100, 1),
+    "Moisture": (30.0, 70.0, 0.1),
+}
+NPK_RANGE = (20, 100)
+
+# Cells scored per predict_proba call while building
+BUILD_CHUNK = 200_000
+
+
+def grid_values(low, high, step):
+    """Grid points as the probes produce them (rounded to the step's decimals)."""
+    decimals = max(0, -int(np.floor(np.log10(step))))
+    count = int(round((high - low) / step)) + 1
+    return np.array([round(low + i * step, decimals) for i in range(count)], dtype=np.float64)
+
+
+def crop_table_hash():
+    """Hash of the crop targets and fertilizer grades the requirement tables derive from."""
+    payload = json.dumps({"crops": CROPS, "fertilizers": FERTILIZERS}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def split_thresholds(model):
+    """Sorted unique split thresholds of every feature, for a sklearn forest or a FlatForest."""
+    if hasattr(model, "estimators_"):
+        trees = [e.tree_ for e in model.estimators_]
+        feature = np.concatenate([t.feature[t.children_left != -1] for t in trees])
+        threshold = np.concatenate([t.threshold[t.children_left != -1] for t in trees])
+    else:
+        feature, threshold = np.asarray(model.feature), np.asarray(model.threshold)
+    return [np.unique(threshold[feature == j]) for j in range(len(FEATURES))]
+
+
+def _bins(thresholds, values):
+    # The trees go left when float32(x) <= threshold, so the number of
+    # thresholds below float32(x) fixes every comparison on this feature
+    return np.searchsorted(thresholds, np.asarray(values, dtype=np.float32).astype(np.float64), side="left")
+
+
+def build_lookup_table(directory, model, model_version, domain=SENSOR_DOMAIN, chunk=BUILD_CHUNK):
+    """Tabulate ``model`` over ``domain`` into a new build under ``directory`` and make it current."""
+    crops_hash = crop_table_hash()
+    build = f"{model_version[:16]}-{crops_hash[:16]}"
+    path = os.path.join(directory, build)
+    os.makedirs(path, exist_ok=True)
+
+    arrays = {}
+    thresholds = split_thresholds(model)
+    representatives = []
+    for j, feature in enumerate(FEATURES):
+        values = grid_values(*domain[feature])
+        bins = _bins(thresholds[j], values)
+        hit, first = np.unique(bins, return_index=True)
+        bin_to_cell = np.full(len(thresholds[j]) + 1, -1, dtype=np.int32)
+        bin_to_cell[hit] = np.arange(len(hit))
+        arrays[f"thresholds_{feature}"] = thresholds[j]
+        arrays[f"cells_{feature}"] = bin_to_cell
+        representatives.append(values[first])
+
+    shape = tuple(len(r) for r in representatives)
+    n_cells = int(np.prod(shape))
+    fertilizer = np.empty(n_cells, dtype=np.uint8)
+    confidence = np.empty(n_cells, dtype=np.float32)
+    classes = None
+    for start in range(0, n_cells, chunk):
+        index = np.unravel_index(np.arange(start, min(start + chunk, n_cells)), shape)
+        X = np.column_stack([r[i] for r, i in zip(representatives, index)])
+        classes, proba = predict_proba_batch(X, model)
+        best = proba.argmax(axis=1)
+        fertilizer[start:start + len(X)] = best
+        confidence[start:start + len(X)] = proba[np.arange(len(X)), best]
+    arrays["fertilizer"] = fertilizer
+    arrays["confidence"] = confidence
+
+    # Requirements only depend on the crop and the N/P/K reading
+    npk = np.arange(NPK_RANGE[0], NPK_RANGE[1] + 1, dtype=np.float64)
+    deficits = np.maximum(CROP_NPK[:, :, None] - npk[None, None, :], 0.0)
+    arrays["deficits"] = deficits
+    arrays["quantities"] = np.round(deficits[:, PRODUCT_NUTRIENT, :] / PRODUCT_GRADE[None, :, None], 1)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "model_version": model_version,
+        "crops_hash": crops_hash,
+        "features": FEATURES,
+        "classes": [str(c) for c in classes],
+        "crops": list(CROP_INDEX),
+        "shape": list(shape),
+        "npk_range": list(NPK_RANGE),
+        "arrays": {name: list(array.shape) for name, array in arrays.items()},
+    }
+    for name, array in arrays.items():
+        write_atomic(os.path.join(path, f"{name}.npy"), lambda f: np.save(f, array))
+    write_atomic(os.path.join(path, "meta.json"), lambda f: f.write(json.dumps(meta, indent=2).encode()))
+    write_atomic(os.path.join(directory, POINTER_FILE), lambda f: f.write(json.dumps({"build": build}).encode()))
+
+    # Older builds can go; processes still mapping them keep their files open
+    for name in os.listdir(directory):
+        if name != build and os.path.isdir(os.path.join(directory, name)):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return meta
+
+
+class LookupTable:
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.classes = meta["classes"]
+        self.shape = tuple(meta["shape"])
+        self.crop_index = {name: i for i, name in enumerate(meta["crops"])}
+        self.npk_low, self.npk_high = meta["npk_range"]
+        self.thresholds = [arrays[f"thresholds_{f}"] for f in FEATURES]
+        self.cells = [arrays[f"cells_{f}"] for f in FEATURES]
+        self.fertilizer = arrays["fertilizer"]
+        self.confidence = arrays["confidence"]
+        self.deficits = arrays["deficits"]
+        self.quantities = arrays["quantities"]
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Current build under ``directory``, or None when there is none."""
+        try:
+            with open(os.path.join(directory, POINTER_FILE)) as f:
+                path = os.path.join(directory, json.load(f)["build"])
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        if meta.get("format") != FORMAT_VERSION:
+            return None
+        arrays = {}
+        for name, shape in meta["arrays"].items():
+            arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            if list(arrays[name].shape) != shape:
+                raise ValueError(f"{name}.npy in {path} does not match its meta.json")
+        return cls(meta, arrays)
+
+    def cell_index(self, rows):
+        """Flat cell of every row of an (n, 5) feature array; -1 where not tabulated."""
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        cells = [cells[_bins(thresholds, rows[:, j])]
+                 for j, (thresholds, cells) in enumerate(zip(self.thresholds, self.cells))]
+        found = np.all([c >= 0 for c in cells], axis=0)
+        index = np.full(len(rows), -1, dtype=np.intp)
+        if found.any():
+            index[found] = np.ravel_multi_index([c[found] for c in cells], self.shape)
+        return index
+
+    def lookup(self, rows):
+        """(fertilizer labels, confidences, found mask) for an (n, 5) feature array."""
+        index = self.cell_index(rows)
+        found = index >= 0
+        labels = np.full(len(index), None, dtype=object)
+        confidence = np.full(len(index), np.nan)
+        labels[found] = np.asarray(self.classes, dtype=object)[self.fertilizer[index[found]]]
+        confidence[found] = self.confidence[index[found]]
+        return labels, confidence, found
+
+    def recommend(self, reading, crop):
+        """Same dict as ``PredictionCache.recommend``, or None if the reading is not tabulated."""
+        crop_id = self.crop_index.get(crop)
+        if crop_id is None:
+            return None
+        features = feature_matrix([reading])[0]
+        npk = features[1:4]
+        if np.any(npk != np.round(npk)) or np.any(npk < self.npk_low) or np.any(npk > self.npk_high):
+            return None
+        cell = self.cell_index(features)[0]
+        if cell < 0:
+            return None
+
+        offsets = (npk - self.npk_low).astype(np.intp)
+        recommendations = {n: float(self.deficits[crop_id, i, offsets[i]]) for i, n in enumerate(NUTRIENTS)}
+        fertilizer_details = {category: {} for category in NUTRIENT_CATEGORIES.values()}
+        for p, (category, product, i, _) in enumerate(PRODUCTS):
+            fertilizer_details[category][product] = float(self.quantities[crop_id, p, offsets[i]])
+        return {
+            "fertilizer": self.classes[self.fertilizer[cell]],
+            "confidence": float(self.confidence[cell]),
+            "recommendations": recommendations,
+            "fertilizer_details": fertilizer_details,
+        }
+
+
+class AutoLookup:
+    """Serves the lookup table for ``model_path`` and rebuilds it when it goes stale.
+
+    A table is stale when it was built from another model version or other
+    crop tables. Until a fresh one is ready ``recommend`` returns None.
+    """
+
+    def __init__(self, directory, model_path=None, mmap_mode=None):
+        self.directory = directory
+        self.model_path = model_path
+        self.mmap_mode = mmap_mode
+        self.crops_hash = crop_table_hash()
+        self._table = None
+        self._building = None
+        self._lock = threading.Lock()
+
+    def _model_path(self):
+        return self.model_path or default_model_path()
+
+    def table(self):
+        version = get_model_version(self._model_path(), self.mmap_mode)
+        table = self._table
+        if table is not None and self._fresh(table, version):
+            return table
+        with self._lock:
+            table = LookupTable.load(self.directory)
+            if table is not None and self._fresh(table, version):
+                self._table = table
+                return table
+            self._table = None
+            if self._building is None or not self._building.is_alive():
+                self._building = threading.Thread(target=self.rebuild, name="lookup-build", daemon=True)
+                self._building.start()
+        return None
+
+    def _fresh(self, table, version):
+        return table.meta["model_version"] == version and table.meta["crops_hash"] == self.crops_hash
+
+    def rebuild(self):
+        model_path = self._model_path()
+        try:
+            version = get_model_version(model_path, self.mmap_mode)
+            logger.info("Building lookup table for model %s in %s", version[:12], self.directory)
+            build_lookup_table(self.directory, get_model(model_path, self.mmap_mode), version)
+        except Exception:
+            logger.exception("Lookup table build failed")
+
+    def recommend(self, reading, crop):
+        table = self.table()
+        return None if table is None else table.recommend(reading, crop)
+
+
+_default_lookup = None
+_default_lock = threading.Lock()
+
+
+def default_lookup():
+    """Process-wide AutoLookup under LOOKUP_TABLE_DIR, or None when that is unset."""
+    global _default_lookup
+    with _default_lock:
+        if _default_lookup is None and os.environ.get("LOOKUP_TABLE_DIR"):
+            _default_lookup = AutoLookup(os.environ["LOOKUP_TABLE_DIR"],
+                                         mmap_mode=os.environ.get("MODEL_MMAP_MODE") or None)
+        return _default_lookup
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the recommendation lookup table.")
+    parser.add_argument("directory", help="lookup table directory")
+    parser.add_argument("--model", default=None,
+                        help="model pickle or forest directory (default: MODEL_PATH, then the forest, then the pickle)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    model_path = args.model or default_model_path()
+    meta = build_lookup_table(args.directory, get_model(model_path), get_model_version(model_path))
+    print(f"Tabulated {np.prod(meta['shape'])} cells {tuple(meta['shape'])} in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
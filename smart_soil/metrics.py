@@ -0,0 +1,312 @@
+"""Tracing spans, counters and latency histograms for the hot paths.
+
+    from smart_soil.metrics import span, timed
+
+    @timed("figure.weather")
+    def build_weather_figure(forecast_df): ...
+
+    with span("weather.fetch"):
+        data = client.get_forecast(...)
+
+Every span name gets a latency histogram and an error counter in the
+process-wide ``registry``, exported as Prometheus text (the prediction
+server's ``/metrics``) or as JSON, optionally dumped to METRICS_DUMP_PATH
+every METRICS_DUMP_INTERVAL seconds. METRICS_ENABLED=0 turns recording
+off; a disabled span is then one attribute check.
+
+``SamplingProfiler`` samples every thread's stack on an interval and can be
+started and stopped at runtime; its collapsed-stack output feeds
+flamegraph.pl or speedscope directly.
+"""
+import bisect
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+SPAN_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+DEFAULT_DUMP_INTERVAL = 60.0
+DEFAULT_PROFILE_INTERVAL = 0.01
+
+_NOOP_SPAN = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """{"buckets": {upper bound: cumulative count}, "sum": ..., "count": ...}."""
+        with self._lock:
+            cumulative = list(itertools.accumulate(self.counts))
+            buckets = dict(zip([*map(str, self.bounds), "+Inf"], cumulative))
+            return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+    def prometheus(self, name, labels="", header=True):
+        """Exposition lines; ``labels`` like 'span="x"' are added to every sample."""
+        snapshot = self.snapshot()
+        prefix = f"{labels}," if labels else ""
+        suffix = f"{{{labels}}}" if labels else ""
+        lines = [f"# TYPE {name} histogram"] if header else []
+        lines += [f'{name}_bucket{{{prefix}le="{le}"}} {count}' for le, count in snapshot["buckets"].items()]
+        lines += [f"{name}_sum{suffix} {snapshot['sum']:.6f}", f"{name}_count{suffix} {snapshot['count']}"]
+        return lines
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+
+
+class MetricsRegistry:
+    """Named counters and span latency histograms."""
+
+    def __init__(self, enabled=True, buckets=SPAN_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._spans = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds, error=False):
+        histogram = self._spans.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._spans.setdefault(name, Histogram(self.buckets))
+        histogram.observe(seconds)
+        if error:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def span(self, name):
+        """Context manager timing its body under ``name``."""
+        return _Span(self, name) if self.enabled else _NOOP_SPAN
+
+    def timed(self, name=None):
+        """Decorator timing every call under ``name`` (default: module.qualname)."""
+        def decorate(func):
+            span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    self.observe(span_name, time.perf_counter() - start, error)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            spans = dict(self._spans)
+            errors = dict(self._errors)
+        return {
+            "enabled": self.enabled,
+            "counters": counters,
+            "spans": {name: {**histogram.snapshot(), "errors": errors.get(name, 0)}
+                      for name, histogram in sorted(spans.items())},
+        }
+
+    def prometheus(self, prefix="smart_soil"):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        if snapshot["spans"]:
+            with self._lock:
+                spans = sorted(self._spans.items())
+            lines.append(f"# TYPE {prefix}_span_seconds histogram")
+            for name, histogram in spans:
+                lines += histogram.prometheus(f"{prefix}_span_seconds", f'span="{name}"', header=False)
+            lines.append(f"# TYPE {prefix}_span_errors_total counter")
+            lines += [f'{prefix}_span_errors_total{{span="{name}"}} {span["errors"]}'
+                      for name, span in snapshot["spans"].items()]
+        return lines
+
+    def dump_json(self, path):
+        """Write ``snapshot()`` (plus a timestamp and pid) to ``path`` atomically."""
+        from smart_soil.forest import write_atomic
+
+        payload = {"timestamp": time.time(), "pid": os.getpid(), **self.snapshot()}
+        write_atomic(path, lambda f: f.write(json.dumps(payload, indent=1).encode()))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._spans.clear()
+            self._errors.clear()
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+class JSONDumper:
+    """Background thread writing ``registry.dump_json(path)`` every ``interval`` seconds."""
+
+    def __init__(self, registry, path, interval=DEFAULT_DUMP_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.dump_json(self.path)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.registry.dump_json(self.path)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads every ``interval`` seconds while running."""
+
+    def __init__(self, interval=DEFAULT_PROFILE_INTERVAL, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler",
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def set_running(self, running):
+        if running:
+            self.start()
+        else:
+            self.stop()
+
+    def _run(self, stop):
+        own = threading.get_ident()
+        while not stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_qualname}({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def collapsed(self):
+        """Samples per stack, one "root;...;leaf count" line each."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def top(self, n=20):
+        """[(function, samples on top of the stack)] for the ``n`` hottest functions."""
+        leaves = Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+    def clear(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+
+registry = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "1") != "0")
+span = registry.span
+timed = registry.timed
+
+_default_dumper = None
+_default_profiler = None
+_default_lock = threading.Lock()
+
+
+def default_json_dumper():
+    """Process-wide dumper of ``registry`` to METRICS_DUMP_PATH, or None when unset."""
+    global _default_dumper
+    with _default_lock:
+        path = os.environ.get("METRICS_DUMP_PATH")
+        if _default_dumper is None and path:
+            interval = float(os.environ.get("METRICS_DUMP_INTERVAL", DEFAULT_DUMP_INTERVAL))
+            _default_dumper = JSONDumper(registry, path, interval)
+        return _default_dumper
+
+
+def default_profiler():
+    """Process-wide profiler (stopped; PROFILE_INTERVAL_MS sets the sampling period)."""
+    global _default_profiler
+    with _default_lock:
+        if _default_profiler is None:
+            interval = float(os.environ.get("PROFILE_INTERVAL_MS", DEFAULT_PROFILE_INTERVAL * 1000)) / 1000
+            _default_profiler = SamplingProfiler(interval)
+        return _default_profiler
@@ -0,0 +1,119 @@
+"""Process-wide registry for trained model artifacts.
+
+Streamlit re-executes ``app.py`` on every widget interaction and for every
+session, but imported modules stay cached in ``sys.modules``. Keeping the
+loaded models here means each artifact is unpickled once per process and
+shared by all sessions, and reloaded only when the file on disk changes.
+
+An artifact is either a joblib pickle or a flat forest directory written by
+``smart_soil.forest``; the latter loads without scikit-learn.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from smart_soil.forest import META_FILE, is_forest, load_forest
+from smart_soil.metrics import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = "fertilizer_model.pkl"
+DEFAULT_FOREST_PATH = "fertilizer_model.forest"
+
+
+def default_model_path():
+    """MODEL_PATH if set, else the exported forest when present, else the pickle."""
+    if os.environ.get("MODEL_PATH"):
+        return os.environ["MODEL_PATH"]
+    return DEFAULT_FOREST_PATH if is_forest(DEFAULT_FOREST_PATH) else DEFAULT_MODEL_PATH
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Entry:
+    def __init__(self, model, mtime_ns, size, sha256):
+        self.model = model
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha256 = sha256
+
+
+class ModelRegistry:
+    """Loads each model artifact once and hot-reloads it when it changes.
+
+    A cheap ``os.stat`` is done on every lookup. Only when the mtime or size
+    differ is the file hashed, and only when the hash differs is it loaded
+    again, so touching the file without changing it costs one hash.
+
+    ``mmap_mode`` is passed to ``np.load`` for a forest directory; with
+    ``"r"`` its arrays are memory-mapped, so several server workers share
+    them through the page cache. It does nothing useful for a pickle:
+    sklearn's trees copy their arrays when unpickled, so every process holds
+    its own copy and a warning is logged. A forest directory is tracked
+    through its ``meta.json``, which is written last and records the hash of
+    every array.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path=DEFAULT_MODEL_PATH, mmap_mode=None):
+        key = (os.path.abspath(path), mmap_mode)
+        tracked = os.path.join(key[0], META_FILE) if os.path.isdir(key[0]) else key[0]
+        stat = os.stat(tracked)
+        entry = self._entries.get(key)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry.model
+
+        with self._lock:
+            entry = self._entries.get(key)
+            stat = os.stat(tracked)
+            if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                return entry.model
+
+            sha256 = file_digest(tracked)
+            if entry is not None and entry.sha256 == sha256:
+                entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+                return entry.model
+
+            with span("model.load"):
+                if tracked != key[0]:
+                    model = load_forest(key[0], mmap_mode=mmap_mode)
+                else:
+                    # Deferred: joblib, and sklearn with the pickle, cost ~2 s to import
+                    import joblib
+
+                    if mmap_mode:
+                        logger.warning("mmap_mode=%r has no effect on %s: sklearn copies tree arrays when "
+                                       "unpickling; export a flat forest to share them", mmap_mode, key[0])
+                    model = joblib.load(key[0])
+            self._entries[key] = _Entry(model, stat.st_mtime_ns, stat.st_size, sha256)
+            return model
+
+    def version(self, path=DEFAULT_MODEL_PATH, mmap_mode=None):
+        # Hash of the artifact currently served for ``path``
+        self.get(path, mmap_mode)
+        return self._entries[(os.path.abspath(path), mmap_mode)].sha256
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_model(path=DEFAULT_MODEL_PATH, mmap_mode=None):
+    return registry.get(path, mmap_mode)
+
+
+def get_model_version(path=DEFAULT_MODEL_PATH, mmap_mode=None):
+    return registry.version(path, mmap_mode)
@@ -0,0 +1,112 @@
+"""Batch fertilizer prediction with the trained RandomForest (pickled or flat forest).
+
+pandas is only imported for DataFrame results and for scoring with the
+pickled sklearn model; a flat forest is fed plain arrays.
+"""
+import sys
+
+import numpy as np
+
+from smart_soil.forest import FlatForest
+from smart_soil.model_registry import default_model_path, get_model
+
+# Feature order the model was trained on (see train_fertilizer_model.py)
+FEATURES = ["pH", "N", "P", "K", "Moisture"]
+
+# Sensor reading keys accepted as aliases for the training column names
+SENSOR_COLUMNS = {
+    "pH": "pH",
+    "nitrogen": "N",
+    "phosphorus": "P",
+    "potassium": "K",
+    "moisture": "Moisture",
+}
+
+
+# Feature column -> the keys it may appear under in a record
+_FEATURE_KEYS = {f: [f] + [alias for alias, name in SENSOR_COLUMNS.items() if name == f and alias != f]
+                 for f in FEATURES}
+
+
+def feature_matrix(records):
+    """(n, 5) float64 array from a list of readings or feature dicts, without pandas."""
+    values = np.empty((len(records), len(FEATURES)), dtype=np.float64)
+    for j, feature in enumerate(FEATURES):
+        keys = _FEATURE_KEYS[feature]
+        for i, record in enumerate(records):
+            for key in keys:
+                if key in record:
+                    values[i, j] = record[key]
+                    break
+            else:
+                missing = [f for f in FEATURES if not any(k in record for k in _FEATURE_KEYS[f])]
+                raise ValueError(f"Missing feature columns: {', '.join(missing)}")
+    # None becomes NaN on assignment; sklearn and FlatForest route NaN differently
+    invalid = ~np.isfinite(values).all(axis=0)
+    if invalid.any():
+        raise ValueError(f"Feature values must be finite numbers: {', '.join(np.array(FEATURES)[invalid])}")
+    return values
+
+
+def _is_frame(rows):
+    # A DataFrame can only exist if pandas was imported by someone
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(rows, pd.DataFrame)
+
+
+def to_feature_array(rows):
+    """Coerce an (n, 5) array, a DataFrame or a list of readings to an (n, 5) float64 array."""
+    if _is_frame(rows):
+        return to_feature_frame(rows).to_numpy()
+
+    if isinstance(rows, (list, tuple)) and rows and isinstance(rows[0], dict):
+        return feature_matrix(rows)
+
+    values = np.asarray(rows, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(1, -1)
+    if values.ndim != 2 or values.shape[1] != len(FEATURES):
+        raise ValueError(f"Expected rows of {len(FEATURES)} features {FEATURES}, got shape {values.shape}")
+    return values
+
+
+def to_feature_frame(rows):
+    """Coerce an (n, 5) array, a DataFrame or a list of readings to model input."""
+    import pandas as pd
+
+    if isinstance(rows, pd.DataFrame):
+        frame = rows.rename(columns=SENSOR_COLUMNS)
+        missing = [c for c in FEATURES if c not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {', '.join(missing)}")
+        return frame[FEATURES].astype(np.float64)
+    return pd.DataFrame(to_feature_array(rows), columns=FEATURES)
+
+
+def predict_proba_batch(rows, model=None):
+    """Return (classes, probability matrix) for all rows in one call."""
+    if model is None:
+        model = get_model(default_model_path())
+    # sklearn checks the column names it was fitted with, so it gets a frame
+    X = to_feature_array(rows) if isinstance(model, FlatForest) else to_feature_frame(rows)
+    if len(X) == 0:
+        return model.classes_, np.empty((0, len(model.classes_)))
+    return model.classes_, model.predict_proba(X)
+
+
+def predict_batch(rows, model=None):
+    """Score many (pH, N, P, K, Moisture) rows with a single predict_proba.
+
+    Returns a DataFrame with one row per input row holding the predicted
+    ``Fertilizer`` and its ``Confidence`` (the winning class probability).
+    The index of a DataFrame input is preserved so results can be joined back.
+    """
+    import pandas as pd
+
+    classes, proba = predict_proba_batch(rows, model)
+    best = proba.argmax(axis=1) if len(proba) else np.empty(0, dtype=np.intp)
+    index = rows.index if _is_frame(rows) else None
+    return pd.DataFrame({
+        "Fertilizer": np.asarray(classes)[best],
+        "Confidence": proba[np.arange(len(proba)), best],
+    }, index=index)
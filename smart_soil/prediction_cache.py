@@ -0,0 +1,179 @@
+"""Cache of predictions and fertilizer requirements for repeated soil features.
+
+Sensor readings come quantized (pH and moisture to 0.1, N/P/K to whole
+ppm), so the same feature vector keeps recurring across plots and over
+time. Results are cached per (crop, exact features) in a bounded LRU;
+inputs are scored as given, never rounded, so a cached answer is exactly
+what inference would return and off-grid inputs simply miss. The whole
+cache is dropped when the model artifact's version changes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from smart_soil.batching import default_batcher
+from smart_soil.fertilizer import calculate_fertilizer_requirements
+from smart_soil.model_registry import default_model_path, get_model_version
+from smart_soil.predict import FEATURES, feature_matrix
+
+DEFAULT_MAXSIZE = 65536
+
+
+def _feature_rows(rows):
+    # (n, 5) float64 features, unrounded
+    if isinstance(rows, (list, tuple)) and rows and isinstance(rows[0], dict):
+        rows = feature_matrix(rows)
+    rows = np.asarray(rows, dtype=np.float64)
+    if rows.ndim == 1:
+        rows = rows.reshape(1, -1) if rows.size else rows.reshape(0, len(FEATURES))
+    return rows
+
+
+class PredictionCache:
+    """LRU of model outputs in front of ``score(X) -> (classes, proba)``.
+
+    ``version()`` identifies the model being served (e.g. the registry's
+    artifact hash); when it changes all entries are discarded.
+    """
+
+    def __init__(self, score, version, maxsize=DEFAULT_MAXSIZE):
+        self.score = score
+        self.version = version
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._classes = None
+        self._version = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _check_version(self):
+        version = self.version()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._classes = None
+                self._version = version
+                self._generation += 1
+            return self._generation
+
+    def _lookup(self, key, count=True):
+        # Caller holds the lock
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        if count:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _store(self, generation, items):
+        with self._lock:
+            # Results scored by a model that has since been replaced are dropped
+            if generation != self._generation:
+                return
+            for key, value in items:
+                self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def predict_proba(self, rows):
+        """(classes, proba) like ``predict_proba_batch``; only unseen feature vectors are scored."""
+        return self._predict_proba(_feature_rows(rows), self._check_version())
+
+    def _predict_proba(self, features, generation, count=True):
+        keys = [(None, *row) for row in features.tolist()]
+        with self._lock:
+            cached = [self._lookup(key, count) for key in keys]
+            classes = self._classes
+
+        missing = {}
+        for i, (key, value) in enumerate(zip(keys, cached)):
+            if value is None:
+                missing.setdefault(key, i)
+        if missing:
+            classes, proba = self.score(features[list(missing.values())])
+            scored = dict(zip(missing, [row.copy() for row in proba]))
+            with self._lock:
+                if generation == self._generation:
+                    self._classes = classes
+            self._store(generation, scored.items())
+            cached = [scored[key] if value is None else value for key, value in zip(keys, cached)]
+        if not keys:
+            return classes, np.empty((0, 0 if classes is None else len(classes)))
+        return classes, np.vstack(cached)
+
+    def recommend(self, reading, crop):
+        """Model prediction plus ``calculate_fertilizer_requirements`` for one reading.
+
+        Returns a dict with ``fertilizer``, ``confidence``, ``recommendations``
+        and ``fertilizer_details``; treat it as read-only.
+        """
+        generation = self._check_version()
+        features = _feature_rows([reading])
+        key = (crop, *features[0].tolist())
+        with self._lock:
+            value = self._lookup(key)
+        if value is not None:
+            return value
+
+        # Lookups of the prediction alone are not counted a second time
+        classes, proba = self._predict_proba(features, generation, count=False)
+        best = int(proba[0].argmax())
+        nitrogen, phosphorus, potassium = features[0, 1:4]
+        recommendations, fertilizer_details = calculate_fertilizer_requirements(
+            {"nitrogen": nitrogen, "phosphorus": phosphorus, "potassium": potassium}, crop)
+        value = {
+            "fertilizer": classes[best],
+            "confidence": float(proba[0, best]),
+            "recommendations": recommendations,
+            "fertilizer_details": fertilizer_details,
+        }
+        self._store(generation, [(key, value)])
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._classes = None
+
+    def stats(self):
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate,
+                "invalidations": self.invalidations}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_prediction_cache():
+    """Process-wide cache scoring misses through ``default_batcher``.
+
+    Holds up to PREDICTION_CACHE_SIZE entries.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            mmap_mode = os.environ.get("MODEL_MMAP_MODE") or None
+            _default_cache = PredictionCache(
+                default_batcher().predict_proba,
+                lambda: get_model_version(default_model_path(), mmap_mode),
+                maxsize=int(os.environ.get("PREDICTION_CACHE_SIZE", DEFAULT_MAXSIZE)),
+            )
+        return _default_cache
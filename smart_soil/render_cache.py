@@ -0,0 +1,98 @@
+"""Render cache for dashboard figures.
+
+Figures are keyed on a hash of the data they are built from, so identical
+inputs (the same forecast, the same month rollup, the same reading) reuse
+the figure instead of rebuilding it with make_subplots. Entries are shared
+by every session in the process.
+
+The cached value is the built plotly Figure together with its serialized
+JSON (produced on first request). Streamlit re-validates figures passed as
+dicts or JSON, which costs about as much as rebuilding them, so
+``st.plotly_chart`` is handed the Figure; the JSON is for consumers outside
+Streamlit.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAXSIZE = 256
+
+
+def data_key(*parts):
+    """Stable hash of DataFrames, arrays and JSON-able values."""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(json.dumps(list(map(str, part.columns))).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(str(part.dtype).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("figure", "json")
+
+    def __init__(self, figure):
+        self.figure = figure
+        self.json = None
+
+
+class FigureCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, name, builder, args):
+        key = (name, data_key(*args))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Build outside the lock; two sessions racing on a miss both build
+        entry = _Entry(builder(*args))
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def figure(self, name, builder, *args):
+        """Cached ``builder(*args)``; treat the returned figure as read-only."""
+        return self._entry(name, builder, args).figure
+
+    def figure_json(self, name, builder, *args):
+        entry = self._entry(name, builder, args)
+        if entry.json is None:
+            entry.json = entry.figure.to_json()
+        return entry.json
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_figure_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = FigureCache()
+        return _default_cache
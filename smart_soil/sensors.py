@@ -0,0 +1,27 @@
+"""Soil sensor readings."""
+import random
+
+
+# Function to simulate sensor readings with more parameters
+def get_sensor_readings():
+    readings = {
+        "pH": round(random.uniform(5.0, 8.0), 1),
+        "nitrogen": random.randint(20, 100),
+        "phosphorus": random.randint(20, 100),
+        "potassium": random.randint(20, 100),
+        "moisture": round(random.uniform(30.0, 70.0), 1),
+        "temperature": round(random.uniform(15.0, 35.0), 1),
+        "humidity": random.randint(40, 90),
+        "organic_matter": round(random.uniform(1.0, 5.0), 1),
+        "ec": round(random.uniform(0.5, 3.0), 1),
+        "soil_type": random.choice(["Sandy", "Loamy", "Clayey"]),
+        "micronutrients": {
+            "zinc": round(random.uniform(0.5, 2.0), 1),
+            "iron": round(random.uniform(2.0, 10.0), 1),
+            "manganese": round(random.uniform(1.0, 5.0), 1),
+            "copper": round(random.uniform(0.2, 1.0), 1),
+            "boron": round(random.uniform(0.2, 1.0), 1)
+        }
+    }
+    return readings
+
@@ -0,0 +1,293 @@
+"""Headless HTTP/JSON fertilizer prediction service.
+
+    python -m smart_soil.server --port 8502 --workers 4
+
+Endpoints:
+
+    POST /predict   {"samples": [{"pH": 6.5, "N": 40, "P": 30, "K": 50, "Moisture": 35,
+                                  "crop": "Wheat"}, ...]}
+                    (a single sample object or a bare list works too; sensor
+                    keys such as "nitrogen" are accepted for the features)
+    GET  /healthz   liveness plus the version of the model being served
+    GET  /metrics   Prometheus text format counters of this worker
+    GET  /debug/profile   collapsed stacks sampled by this worker's profiler
+    POST /debug/profile   {"enabled": true} starts the sampling profiler,
+                          {"enabled": false} stops it, {"clear": true} drops samples
+
+Requests arriving within a few milliseconds of each other, on any
+connection, are scored together with one ``predict_proba`` call by a
+``MicroBatcher``, whose batch size, queue depth and latency histograms
+are part of ``/metrics``, as are the latency histograms of the spans in
+``smart_soil.metrics`` (model loads, requirement calculations). Unless ``--cache-size 0`` is given, repeated
+feature vectors (compared exactly, never rounded) are answered from a
+``PredictionCache`` without scoring. With
+``--workers N`` the server forks N processes that all bind the same port
+with SO_REUSEPORT and the kernel spreads connections between them; every
+worker loads the model through the registry (memory-mapped for a flat
+forest), so the tree arrays are shared through the page cache.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from smart_soil.batching import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT, MicroBatcher
+from smart_soil.fertilizer import NUTRIENTS, PRODUCT_NAMES, calculate_fertilizer_requirements_batch
+from smart_soil.metrics import default_profiler, registry as span_registry
+from smart_soil.model_registry import default_model_path, get_model, get_model_version
+from smart_soil.predict import feature_matrix, predict_proba_batch
+from smart_soil.prediction_cache import DEFAULT_MAXSIZE, PredictionCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8502
+MAX_BODY = 16 << 20
+
+
+class _Metrics:
+    def __init__(self):
+        self.requests = {}
+        self.samples = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, path, status, seconds, samples=0):
+        with self._lock:
+            key = (path, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.samples += samples
+            self.latency_sum += seconds
+            self.latency_count += 1
+
+    def render(self, batcher, cache=None):
+        with self._lock:
+            lines = ["# TYPE fertilizer_requests_total counter"]
+            for (path, status), count in sorted(self.requests.items()):
+                lines.append(f'fertilizer_requests_total{{path="{path}",status="{status}"}} {count}')
+            lines += [
+                "# TYPE fertilizer_samples_total counter",
+                f"fertilizer_samples_total {self.samples}",
+                "# TYPE fertilizer_request_seconds summary",
+                f"fertilizer_request_seconds_sum {self.latency_sum:.6f}",
+                f"fertilizer_request_seconds_count {self.latency_count}",
+            ]
+        lines += batcher.prometheus("fertilizer_predict")
+        if cache is not None:
+            lines += [
+                "# TYPE fertilizer_cache_hits_total counter", f"fertilizer_cache_hits_total {cache.hits}",
+                "# TYPE fertilizer_cache_misses_total counter", f"fertilizer_cache_misses_total {cache.misses}",
+                "# TYPE fertilizer_cache_entries gauge", f"fertilizer_cache_entries {len(cache)}",
+                "# TYPE fertilizer_cache_invalidations_total counter",
+                f"fertilizer_cache_invalidations_total {cache.invalidations}",
+            ]
+        lines += span_registry.prometheus()
+        return "\n".join(lines) + "\n"
+
+
+def parse_samples(body):
+    """Request JSON -> list of sample dicts."""
+    if isinstance(body, dict):
+        body = body.get("samples", [body])
+    if not isinstance(body, list) or not body or not all(isinstance(s, dict) for s in body):
+        raise ValueError("Expected a sample object, a list of them or {\"samples\": [...]}")
+    return body
+
+
+def recommend(samples, score):
+    """Predicted fertilizer per sample, plus N/P/K requirements for samples naming a ``crop``.
+
+    ``score(features)`` returns ``(classes, proba)`` for an (n, 5) array.
+    """
+    features = feature_matrix(samples)
+    classes, proba = score(features)
+    best = proba.argmax(axis=1)
+    results = [
+        {"fertilizer": str(classes[b]), "confidence": float(p[b])} for b, p in zip(best, proba)
+    ]
+
+    with_crop = [i for i, s in enumerate(samples) if s.get("crop") is not None]
+    if with_crop:
+        # Columns 1-3 of the feature matrix are N, P, K
+        deficits, quantities = calculate_fertilizer_requirements_batch(
+            features[with_crop, 1], features[with_crop, 2], features[with_crop, 3],
+            [str(samples[i]["crop"]) for i in with_crop])
+        for i, deficit, quantity in zip(with_crop, deficits, quantities):
+            results[i]["requirements"] = dict(zip(NUTRIENTS, deficit.tolist()))
+            results[i]["products"] = dict(zip(PRODUCT_NAMES, quantity.tolist()))
+    return results
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    server_version = "SmartSoil"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+        return status
+
+    def do_GET(self):
+        start = time.perf_counter()
+        if self.path == "/healthz":
+            try:
+                status = self._send(200, {"status": "ok", "pid": os.getpid(),
+                                          "model_version": self.server.model_version()})
+            except OSError as e:
+                status = self._send(503, {"status": "unavailable", "error": str(e)})
+        elif self.path == "/metrics":
+            status = self._send(200, self.server.metrics.render(self.server.batcher, self.server.cache),
+                                "text/plain; version=0.0.4")
+        elif self.path == "/debug/profile":
+            status = self._send(200, default_profiler().collapsed(), "text/plain")
+        else:
+            status = self._send(404, {"error": "Not found"})
+        self.server.metrics.observe(self.path, status, time.perf_counter() - start)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            # The body is left unread, so the connection can't be reused
+            self.close_connection = True
+            raise ValueError("Request body too large")
+        return json.loads(self.rfile.read(length))
+
+    def do_POST(self):
+        start = time.perf_counter()
+        samples = []
+        if self.path == "/debug/profile":
+            try:
+                body = self._read_json()
+                if not isinstance(body, dict):
+                    raise ValueError("Expected {\"enabled\": true|false} and/or {\"clear\": true}")
+            except ValueError as e:
+                status = self._send(400, {"error": str(e)})
+            else:
+                profiler = default_profiler()
+                if "enabled" in body:
+                    profiler.set_running(bool(body["enabled"]))
+                if body.get("clear"):
+                    profiler.clear()
+                status = self._send(200, {"running": profiler.running, "samples": profiler.samples})
+        elif self.path != "/predict":
+            # Unread body bytes would be parsed as the next request
+            self.close_connection = True
+            status = self._send(404, {"error": "Not found"})
+        else:
+            try:
+                samples = parse_samples(self._read_json())
+                results = recommend(samples, self.server.score)
+            except (ValueError, TypeError, KeyError) as e:
+                status = self._send(400, {"error": str(e)})
+            except Exception as e:
+                logger.exception("Prediction failed")
+                status = self._send(500, {"error": str(e)})
+            else:
+                status = self._send(200, {"predictions": results})
+        self.server.metrics.observe(self.path, status, time.perf_counter() - start, len(samples))
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model_path=None, mmap_mode=None, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT, cache_size=DEFAULT_MAXSIZE, reuse_port=False):
+        self.reuse_port = reuse_port
+        self.model_path = model_path or default_model_path()
+        self.mmap_mode = mmap_mode
+        # Load now so a broken artifact fails at startup, not on the first request
+        get_model(self.model_path, self.mmap_mode)
+        self.batcher = MicroBatcher(self._predict, max_batch, max_wait, name="predict-batcher")
+        self.cache = PredictionCache(self.batcher.predict_proba, self.model_version, cache_size) if cache_size else None
+        self.score = self.cache.predict_proba if self.cache is not None else self.batcher.predict_proba
+        self.metrics = _Metrics()
+        super().__init__(address, PredictionHandler)
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def _predict(self, features):
+        return predict_proba_batch(features, get_model(self.model_path, self.mmap_mode))
+
+    def model_version(self):
+        return get_model_version(self.model_path, self.mmap_mode)
+
+
+def _serve(host, port, options):
+    server = PredictionServer((host, port), **options)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Worker %d serving on %s:%d", os.getpid(), *server.server_address[:2])
+    with server:
+        server.serve_forever()
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=1, **options):
+    """Run the service in this process, or in ``workers`` forked processes sharing the port."""
+    if workers <= 1:
+        _serve(host, port, options)
+        return
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Multiple workers need SO_REUSEPORT, which this platform lacks")
+    if port == 0:
+        raise ValueError("Multiple workers need a fixed port")
+    options["reuse_port"] = True
+    processes = [multiprocessing.Process(target=_serve, args=(host, port, options), name=f"predict-worker-{i}")
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    def stop(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop()
+        for process in processes:
+            process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fertilizer predictions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: %(default)s)")
+    parser.add_argument("--model", default=None,
+                        help="model pickle or forest directory (default: MODEL_PATH, then the forest, then the pickle)")
+    parser.add_argument("--mmap-mode", default=os.environ.get("MODEL_MMAP_MODE") or None,
+                        help="memory-map a flat forest's arrays, e.g. r; no effect on a pickle "
+                             "(default: MODEL_MMAP_MODE)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="most rows scored in one call (default: %(default)s)")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="how long to collect requests into a batch (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAXSIZE,
+                        help="cached predictions for repeated samples, 0 to disable (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    serve(args.host, args.port, args.workers, model_path=args.model, mmap_mode=args.mmap_mode,
+          max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000, cache_size=args.cache_size)
+
+
+if __name__ == "__main__":
+    main()
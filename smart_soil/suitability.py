@@ -0,0 +1,151 @@
+"""Crop suitability ranking over the whole CROPS table.
+
+CROPS is turned into struct-of-arrays form once (one array per attribute,
+one entry per crop), and a matrix of field readings is scored against
+every crop with broadcasting: (fields, 1) against (1, crops). Each
+component score is in [0, 1]:
+
+- nutrients: 1 minus the mean N/P/K deficit as a fraction of the crop's target
+- pH and temperature: 1 inside the crop's window, falling linearly to 0
+  PH_MARGIN / TEMPERATURE_MARGIN outside it
+- water: forecast rainfall as a fraction of the crop's weekly water need
+- season: 1 if the month falls in one of the crop's seasons
+
+and the suitability is their WEIGHTS-weighted sum. Components without
+data (no rainfall forecast, no month) score 1 for every crop, so they do
+not change the ranking. Scoring is memory bound, so it runs in float32.
+"""
+import numpy as np
+
+from smart_soil.crops import CROPS
+from smart_soil.fertilizer import CROP_NAMES, CROP_NPK
+
+COMPONENTS = ("nutrients", "pH", "temperature", "water", "season")
+WEIGHTS = {"nutrients": 0.3, "pH": 0.2, "temperature": 0.2, "water": 0.15, "season": 0.15}
+
+PH_MARGIN = 1.0
+TEMPERATURE_MARGIN = 5.0
+
+# Rough weekly crop water use in mm for each water_requirement level
+WATER_NEED_MM = {"Low": 15.0, "Medium": 30.0, "High": 50.0}
+
+# Calendar months of each growing season
+SEASON_MONTHS = {"Kharif": (6, 7, 8, 9, 10), "Rabi": (11, 12, 1, 2, 3)}
+
+# Struct-of-arrays view of CROPS, in CROP_NAMES order
+CROP_TARGETS = CROP_NPK.astype(np.float32)
+CROP_PH = np.array([CROPS[name]["pH"] for name in CROP_NAMES], dtype=np.float32)
+CROP_TEMPERATURE = np.array([CROPS[name]["temperature_range"] for name in CROP_NAMES], dtype=np.float32)
+CROP_WATER_MM = np.array([WATER_NEED_MM[CROPS[name]["water_requirement"]] for name in CROP_NAMES],
+                         dtype=np.float32)
+# (crops, 13) whether each crop is in season in each month (column 0 unused)
+CROP_MONTHS = np.array([[any(month in SEASON_MONTHS[season] for season in CROPS[name]["season"])
+                         for month in range(13)] for name in CROP_NAMES])
+
+
+def _window_score(values, window, margin):
+    # values (n, 1) against (crops, 2) [low, high] windows -> (n, crops)
+    distance = np.maximum(window[:, 0] - values, values - window[:, 1])
+    distance *= -1.0 / margin
+    distance += 1.0
+    # maximum/minimum with out= are much faster than np.clip here
+    np.maximum(distance, 0.0, out=distance)
+    return np.minimum(distance, 1.0, out=distance)
+
+
+def _components(nitrogen, phosphorus, potassium, ph, temperature, rainfall, month):
+    # Yields (name, (n, crops) array or a scalar shared by all), computed
+    # one at a time with few temporaries
+    nitrogen, phosphorus, potassium, ph, temperature = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=np.float32)) for v in (nitrogen, phosphorus, potassium, ph, temperature)))
+    n = len(nitrogen)
+
+    # Mean over N/P/K of the deficit as a fraction of the crop's target
+    nutrients = np.ones((n, len(CROP_NAMES)), dtype=np.float32)
+    for j, soil in enumerate((nitrogen, phosphorus, potassium)):
+        deficit = np.subtract(CROP_TARGETS[:, j], soil[:, None])
+        np.maximum(deficit, 0.0, out=deficit)
+        np.minimum(deficit, CROP_TARGETS[:, j], out=deficit)
+        deficit *= 1.0 / (3 * CROP_TARGETS[:, j])
+        nutrients -= deficit
+    yield "nutrients", nutrients
+    yield "pH", _window_score(ph[:, None], CROP_PH, PH_MARGIN)
+    yield "temperature", _window_score(temperature[:, None], CROP_TEMPERATURE, TEMPERATURE_MARGIN)
+
+    if rainfall is None:
+        yield "water", 1.0
+    else:
+        rain = np.broadcast_to(np.asarray(rainfall, dtype=np.float32), (n,))
+        # Fields without a forecast (NaN) score 1 for every crop
+        rain = np.where(np.isnan(rain), np.inf, rain)
+        water = np.divide(rain[:, None], CROP_WATER_MM)
+        yield "water", np.minimum(water, 1.0, out=water)
+
+    if month is None:
+        yield "season", 1.0
+    else:
+        yield "season", CROP_MONTHS.T[np.broadcast_to(np.asarray(month, dtype=np.intp), (n,))]
+
+
+def score_crops(nitrogen, phosphorus, potassium, ph, temperature, rainfall=None, month=None):
+    """Suitability of every crop for every field, an (n, len(CROP_NAMES)) array.
+
+    Readings are arrays (or scalars shared by all fields): soil N/P/K in
+    ppm, pH, temperature in °C, forecast ``rainfall`` in mm per week (NaN
+    where unknown) and the calendar ``month``.
+    """
+    scores = None
+    constant = 0.0
+    for name, component in _components(nitrogen, phosphorus, potassium, ph, temperature, rainfall, month):
+        weight = WEIGHTS[name]
+        if np.isscalar(component):
+            constant += weight * component
+        elif component.dtype == bool:
+            np.add(scores, weight, out=scores, where=component)
+        elif scores is None:
+            scores = np.multiply(component, weight, out=component)
+        else:
+            scores += weight * component
+    scores += constant
+    return scores
+
+
+def crop_components(nitrogen, phosphorus, potassium, ph, temperature, rainfall=None, month=None):
+    """The component scores behind ``score_crops``: {name: (n, len(CROP_NAMES)) array}."""
+    components = {}
+    for name, component in _components(nitrogen, phosphorus, potassium, ph, temperature, rainfall, month):
+        shape = components["nutrients"].shape if components else None
+        components[name] = np.broadcast_to(np.asarray(component, dtype=np.float32), shape or np.shape(component))
+    return components
+
+
+def rank_crops(*args, top=None, **kwargs):
+    """Crops ordered by suitability per field: ``(crop ids, scores)``, both (n, top).
+
+    Takes the arguments of ``score_crops``; ids index CROP_NAMES.
+    """
+    scores = score_crops(*args, **kwargs)
+    order = np.argsort(-scores, axis=1)[:, :top]
+    return order, np.take_along_axis(scores, order, axis=1)
+
+
+def rank_reading(readings, rainfall=None, month=None):
+    """Ranked [{"crop", "score", <component>: ...}] for one sensor reading, best first."""
+    args = (readings["nitrogen"], readings["phosphorus"], readings["potassium"], readings["pH"],
+            readings["temperature"], rainfall, month)
+    scores = score_crops(*args)[0]
+    components = crop_components(*args)
+    return [
+        {"crop": CROP_NAMES[i], "score": float(scores[i]),
+         **{name: float(components[name][0, i]) for name in COMPONENTS}}
+        for i in np.argsort(-scores, kind="stable")
+    ]
+
+
+def weekly_rainfall(forecast_df):
+    """Total forecast rainfall scaled to mm per week, or None for an empty forecast."""
+    if forecast_df is None or not len(forecast_df):
+        return None
+    # Each forecast slot covers 3 hours
+    days = len(forecast_df) * 3 / 24
+    return float(forecast_df["rainfall"].sum()) * 7 / days
@@ -0,0 +1,290 @@
+"""Append-only columnar store for soil sensor readings.
+
+Each field keeps one fixed-dtype array per channel plus an int64 array of
+Unix timestamps, about 65 bytes per reading instead of the ~2 KB a nested
+reading dict costs. In memory the arrays grow by doubling; with a ``root``
+directory every channel is an append-only binary file per field that is
+read back through ``np.memmap``, so years of history for thousands of plots
+stay on disk and only the queried ranges are paged in.
+"""
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Numeric channels and where they live in a reading
+CHANNELS = {
+    "pH": ("pH",),
+    "nitrogen": ("nitrogen",),
+    "phosphorus": ("phosphorus",),
+    "potassium": ("potassium",),
+    "moisture": ("moisture",),
+    "temperature": ("temperature",),
+    "humidity": ("humidity",),
+    "organic_matter": ("organic_matter",),
+    "ec": ("ec",),
+    "zinc": ("micronutrients", "zinc"),
+    "iron": ("micronutrients", "iron"),
+    "manganese": ("micronutrients", "manganese"),
+    "copper": ("micronutrients", "copper"),
+    "boron": ("micronutrients", "boron"),
+}
+SOIL_TYPES = ["Sandy", "Loamy", "Clayey"]
+
+# Column dtypes; soil_type is stored as an index into SOIL_TYPES
+DTYPES = dict({name: np.float32 for name in CHANNELS}, timestamp=np.int64, soil_type=np.uint8)
+
+# Bucket widths in seconds; months are calendar months
+FREQUENCIES = {"hour": 3600, "day": 86400, "month": None}
+AGGREGATES = ("mean", "min", "max", "count")
+
+INITIAL_CAPACITY = 1024
+
+
+def reading_columns(reading):
+    """One reading dict -> {column: scalar}."""
+    row = {}
+    for name, path in CHANNELS.items():
+        value = reading
+        for key in path:
+            value = value[key]
+        row[name] = value
+    row["timestamp"] = int(reading["timestamp"])
+    row["soil_type"] = SOIL_TYPES.index(reading["soil_type"]) if reading.get("soil_type") in SOIL_TYPES else 255
+    return row
+
+
+class _MemoryColumns:
+    def __init__(self):
+        self.length = 0
+        self._arrays = {name: np.empty(INITIAL_CAPACITY, dtype=dtype) for name, dtype in DTYPES.items()}
+
+    def append(self, columns, n):
+        capacity = len(self._arrays["timestamp"])
+        if self.length + n > capacity:
+            capacity = max(capacity * 2, self.length + n)
+            for name, array in self._arrays.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self.length] = array[:self.length]
+                self._arrays[name] = grown
+        for name, values in columns.items():
+            self._arrays[name][self.length:self.length + n] = values
+        self.length += n
+
+    def column(self, name):
+        return self._arrays[name][:self.length]
+
+
+class _FileColumns:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._maps = {}
+        size = os.path.getsize(self._path("timestamp")) if os.path.exists(self._path("timestamp")) else 0
+        self.length = size // np.dtype(DTYPES["timestamp"]).itemsize
+        # Drop channel bytes left behind by an interrupted append
+        for name, dtype in DTYPES.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > self.length * np.dtype(dtype).itemsize:
+                os.truncate(path, self.length * np.dtype(dtype).itemsize)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.{np.dtype(DTYPES[name]).str[1:]}")
+
+    def append(self, columns, n):
+        # Timestamps are written last so a crash mid-append never exposes a
+        # row whose channels are missing
+        for name in sorted(columns, key=lambda c: c == "timestamp"):
+            with open(self._path(name), "ab") as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=DTYPES[name]).tobytes())
+        self.length += n
+        self._maps.clear()
+
+    def column(self, name):
+        if self.length == 0:
+            return np.empty(0, dtype=DTYPES[name])
+        if name not in self._maps:
+            self._maps[name] = np.memmap(self._path(name), dtype=DTYPES[name], mode="r", shape=(self.length,))
+        return self._maps[name]
+
+
+class SoilSeriesStore:
+    def __init__(self, root=None):
+        self.root = root
+        self.rejected = 0
+        self._fields = {}
+        self._lock = threading.Lock()
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+            for name in os.listdir(root):
+                if os.path.isdir(os.path.join(root, name)):
+                    self._fields[name] = _FileColumns(os.path.join(root, name))
+
+    def fields(self):
+        return list(self._fields)
+
+    def __len__(self):
+        return sum(columns.length for columns in self._fields.values())
+
+    def _columns(self, field):
+        columns = self._fields.get(field)
+        if columns is None:
+            if self.root is None:
+                columns = _MemoryColumns()
+            else:
+                if not re.fullmatch(r"[\w.-]+", field) or field.startswith("."):
+                    raise ValueError(f"Invalid field id: {field!r}")
+                columns = _FileColumns(os.path.join(self.root, field))
+            self._fields[field] = columns
+        return columns
+
+    def append(self, field, reading):
+        row = reading_columns(reading)
+        self.append_many(field, {name: [value] for name, value in row.items()})
+
+    def append_many(self, field, columns):
+        """Append a batch of rows given as {column: array}; missing channels are NaN.
+
+        Timestamps must not go backwards within a field.
+        """
+        timestamps = np.asarray(columns["timestamp"], dtype=np.int64)
+        n = len(timestamps)
+        if n == 0:
+            return
+        if np.any(np.diff(timestamps) < 0):
+            raise ValueError("Timestamps must be in ascending order")
+        batch = {}
+        for name, dtype in DTYPES.items():
+            if name in columns:
+                batch[name] = np.asarray(columns[name], dtype=dtype)
+            else:
+                batch[name] = np.full(n, 255 if name == "soil_type" else np.nan, dtype=dtype)
+        with self._lock:
+            store = self._columns(field)
+            if store.length and timestamps[0] < store.column("timestamp")[-1]:
+                raise ValueError(f"Reading for {field} is older than the last stored one")
+            store.append(batch, n)
+
+    def attach(self, stream):
+        """Record every reading published on a SensorStream, per ``field`` (or sensor)."""
+        def record(reading):
+            try:
+                self.append(str(reading.get("field", reading["sensor_id"])), reading)
+            except (ValueError, KeyError, TypeError) as e:
+                self.rejected += 1
+                logger.warning("Not storing reading: %s", e)
+
+        # Subscribe first so nothing published during the backfill is lost;
+        # readings delivered meanwhile are held back and recorded after the
+        # backfill, minus those it already covered
+        lock = threading.Lock()
+        pending = []
+
+        def on_reading(reading):
+            with lock:
+                if pending is None:
+                    record(reading)
+                else:
+                    pending.append(reading)
+
+        stream.subscribe(on_reading)
+        backlog = stream.recent()
+        # The buffer holds the same objects that subscribers receive
+        seen = {id(reading) for reading in backlog}
+        with lock:
+            for reading in backlog:
+                record(reading)
+            for reading in pending:
+                if id(reading) not in seen:
+                    record(reading)
+            pending = None
+
+    def _slice(self, field, start, end):
+        columns = self._fields.get(field)
+        if columns is None:
+            return None, slice(0, 0)
+        timestamps = columns.column("timestamp")
+        lo = 0 if start is None else np.searchsorted(timestamps, _to_seconds(start), side="left")
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, _to_seconds(end), side="left")
+        return columns, slice(lo, hi)
+
+    def query(self, field, start=None, end=None, channels=None):
+        """Raw readings of ``field`` with start <= time < end as a DataFrame."""
+        channels = list(CHANNELS) if channels is None else list(channels)
+        columns, rows = self._slice(field, start, end)
+        if columns is None:
+            return pd.DataFrame(columns=["time"] + channels)
+        frame = {"time": columns.column("timestamp")[rows].astype("datetime64[s]")}
+        for name in channels:
+            frame[name] = np.array(columns.column(name)[rows])
+        return pd.DataFrame(frame)
+
+    def downsample(self, field, freq="day", start=None, end=None, channels=None, aggregates=AGGREGATES):
+        """Per-bucket aggregates (hour/day/month) of ``field``.
+
+        Columns are named ``<channel>_<aggregate>``, plus ``time`` (bucket
+        start) and ``count``. Timestamps are sorted, so buckets are
+        contiguous runs reduced with ``np.*.reduceat`` without any sort.
+        """
+        if freq not in FREQUENCIES:
+            raise ValueError(f"freq must be one of {', '.join(FREQUENCIES)}")
+        channels = list(CHANNELS) if channels is None else list(channels)
+        columns, rows = self._slice(field, start, end)
+        names = [f"{c}_{a}" for c in channels for a in aggregates if a != "count"]
+        if columns is None or rows.stop <= rows.start:
+            return pd.DataFrame(columns=["time", "count"] + names)
+
+        timestamps = np.asarray(columns.column("timestamp")[rows])
+        if FREQUENCIES[freq] is None:
+            buckets = timestamps.astype("datetime64[s]").astype("datetime64[M]")
+        else:
+            buckets = (timestamps // FREQUENCIES[freq] * FREQUENCIES[freq]).astype("datetime64[s]")
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(timestamps)])
+
+        result = {"time": buckets[starts].astype("datetime64[s]"), "count": counts}
+        for name in channels:
+            values = np.asarray(columns.column(name)[rows], dtype=np.float64)
+            if "mean" in aggregates:
+                result[f"{name}_mean"] = np.add.reduceat(values, starts) / counts
+            if "min" in aggregates:
+                result[f"{name}_min"] = np.minimum.reduceat(values, starts)
+            if "max" in aggregates:
+                result[f"{name}_max"] = np.maximum.reduceat(values, starts)
+        return pd.DataFrame(result)
+
+    def nbytes(self):
+        return sum(
+            columns.column(name).nbytes for columns in self._fields.values() for name in DTYPES
+        )
+
+
+def _to_seconds(value):
+    if isinstance(value, (int, np.integer, float, np.floating)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """Process-wide store recording the default sensor stream.
+
+    Kept in memory unless SOIL_STORE_DIR names a directory for the
+    per-field channel files.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            from smart_soil.ingestion import default_stream
+            store = SoilSeriesStore(os.environ.get("SOIL_STORE_DIR") or None)
+            store.attach(default_stream())
+            _default_store = store
+        return _default_store
@@ -0,0 +1,93 @@
+"""Parsing of OpenWeatherMap 5 day / 3 hour forecast payloads.
+
+Payloads are turned straight into typed columns: one pass per field over the
+``list`` items with ``np.fromiter``, no intermediate list of dicts, and the
+timestamps kept as a datetime64 column.
+"""
+import time
+
+import numpy as np
+
+WIND_DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                   'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+_WIND_DIRECTIONS = np.array(WIND_DIRECTIONS)
+
+# Columns of a parsed forecast, in display order
+FORECAST_COLUMNS = ["date", "temperature", "humidity", "rainfall", "wind_speed", "wind_direction",
+                    "cloud_cover", "pressure", "visibility", "description", "icon"]
+
+
+def get_wind_direction(degrees):
+    index = round(degrees / (360. / len(WIND_DIRECTIONS))) % len(WIND_DIRECTIONS)
+    return WIND_DIRECTIONS[index]
+
+
+def wind_directions(degrees):
+    """Vectorized get_wind_direction over an array of degrees."""
+    sectors = 360. / len(WIND_DIRECTIONS)
+    index = np.round(np.asarray(degrees, dtype=np.float64) / sectors).astype(np.intp) % len(WIND_DIRECTIONS)
+    return _WIND_DIRECTIONS[index]
+
+
+def local_datetimes(timestamps):
+    """Unix seconds -> naive local datetime64, like datetime.fromtimestamp.
+
+    The UTC offset is looked up once per distinct timestamp; locations in a
+    batch share the same 3-hour slots, so that is ~40 lookups per batch.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    unique, inverse = np.unique(timestamps, return_inverse=True)
+    offsets = np.fromiter((time.localtime(t).tm_gmtoff for t in unique.tolist()),
+                          dtype=np.int64, count=len(unique))
+    return (timestamps + offsets[inverse]).astype("datetime64[s]").astype("datetime64[ns]")
+
+
+def _column(items, getter, dtype=np.float64):
+    return np.fromiter(map(getter, items), dtype=dtype, count=len(items))
+
+
+def forecast_columns(items):
+    """Typed column arrays for a sequence of forecast ``list`` items."""
+    return {
+        "date": local_datetimes(_column(items, lambda item: item['dt'], np.int64)),
+        # Python's round, as the original parser used: np.round scales by 10
+        # first and can differ on ties (21.85 -> 21.9, but np.round gives 21.8)
+        "temperature": _column(items, lambda item: round(item['main']['temp'], 1)),
+        "humidity": _column(items, lambda item: item['main']['humidity'], np.int16),
+        "rainfall": _column(items, lambda item: item.get('rain', {}).get('3h', 0)),
+        "wind_speed": _column(items, lambda item: round(item['wind']['speed'] * 3.6, 1)),
+        "wind_direction": wind_directions(_column(items, lambda item: item['wind']['deg'])),
+        "cloud_cover": _column(items, lambda item: item['clouds']['all'], np.int16),
+        "pressure": _column(items, lambda item: round(item['main']['pressure'], 1)),
+        "visibility": _column(items, lambda item: round(item.get('visibility', np.nan) / 1000, 1)),
+        "description": [item['weather'][0]['description'] for item in items],
+        "icon": [item['weather'][0]['icon'] for item in items],
+    }
+
+
+def parse_forecast(data):
+    """Forecast payload -> DataFrame with FORECAST_COLUMNS."""
+    import pandas as pd
+
+    return pd.DataFrame(forecast_columns(data['list']), columns=FORECAST_COLUMNS)
+
+
+def parse_forecasts(payloads):
+    """Parse payloads for many locations into one frame.
+
+    ``payloads`` maps (latitude, longitude) to a forecast payload. All items
+    are parsed in a single columnar pass and tagged with their location.
+    """
+    import pandas as pd
+
+    items, latitudes, longitudes = [], [], []
+    for (latitude, longitude), data in payloads.items():
+        items.extend(data['list'])
+        latitudes.append(np.full(len(data['list']), latitude))
+        longitudes.append(np.full(len(data['list']), longitude))
+    columns = {
+        "latitude": np.concatenate(latitudes) if latitudes else np.empty(0),
+        "longitude": np.concatenate(longitudes) if longitudes else np.empty(0),
+    }
+    columns.update(forecast_columns(items))
+    return pd.DataFrame(columns, columns=["latitude", "longitude"] + FORECAST_COLUMNS)
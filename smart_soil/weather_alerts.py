@@ -0,0 +1,233 @@
+"""Declarative farming weather alerts.
+
+Each rule is a list of (column, operator, threshold) conditions that must all
+hold. Rules are evaluated as boolean masks over every slot of a forecast
+frame, for one location or many at once, and contiguous runs of a firing
+rule are collapsed into a compact alert timeline.
+"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+def _total_rainfall(forecast_df, groups):
+    # Rainfall summed over the whole forecast of the slot's location
+    if groups is None:
+        return pd.Series(forecast_df["rainfall"].sum(), index=forecast_df.index)
+    return forecast_df["rainfall"].groupby(groups).transform("sum")
+
+
+# Columns that can be used in conditions on top of the forecast columns
+DERIVED_COLUMNS = {
+    "total_rainfall": _total_rainfall,
+}
+
+LOCATION_COLUMNS = ["latitude", "longitude"]
+
+ALERT_RULES = [
+    {
+        "name": "High Temperature",
+        "level": "warning",
+        "conditions": [("temperature", ">", 35)],
+        "advice": [
+            "Avoid fertilizer application during peak hours (10 AM - 4 PM)",
+            "Consider early morning (5-7 AM) or late evening (5-7 PM) operations",
+            "Increase irrigation frequency to prevent heat stress",
+            "Monitor soil moisture more frequently",
+        ],
+    },
+    {
+        "name": "Low Temperature",
+        "level": "warning",
+        "conditions": [("temperature", "<", 10)],
+        "advice": [
+            "Delay fertilizer application until temperatures rise",
+            "Protect young plants with mulch or covers",
+            "Consider using cold-resistant crop varieties",
+            "Monitor for frost damage",
+        ],
+    },
+    {
+        "name": "Heavy Rainfall",
+        "level": "warning",
+        "conditions": [("rainfall", ">", 10)],
+        "advice": [
+            "Postpone fertilizer application to prevent runoff",
+            "Check drainage systems",
+            "Monitor for waterlogging",
+            "Prepare for potential disease outbreaks",
+            "Consider foliar applications after rain stops",
+        ],
+    },
+    {
+        "name": "Dry Spell",
+        "level": "warning",
+        "conditions": [("rainfall", "==", 0), ("total_rainfall", "<", 5)],
+        "advice": [
+            "Increase irrigation frequency",
+            "Consider drought-resistant crop varieties",
+            "Apply mulch to conserve soil moisture",
+            "Monitor soil moisture levels closely",
+            "Schedule irrigation during cooler hours",
+        ],
+    },
+    {
+        "name": "Strong Wind",
+        "level": "warning",
+        "conditions": [("wind_speed", ">", 30)],
+        "advice": [
+            "Postpone spraying operations",
+            "Secure farm structures and equipment",
+            "Protect young plants with windbreaks",
+            "Delay fertilizer application to prevent drift",
+            "Consider using granular fertilizers instead of sprays",
+        ],
+    },
+    {
+        "name": "Calm Wind Conditions",
+        "level": "info",
+        "conditions": [("wind_speed", "<", 5)],
+        "advice": [
+            "Ideal for spraying operations",
+            "Good time for foliar applications",
+            "Suitable for aerial spraying if needed",
+            "Consider applying liquid fertilizers",
+        ],
+    },
+    {
+        "name": "High Humidity",
+        "level": "warning",
+        "conditions": [("humidity", ">", 80)],
+        "advice": [
+            "Increased risk of fungal diseases",
+            "Monitor for pest infestations",
+            "Consider preventive fungicide applications",
+            "Ensure proper ventilation in greenhouses",
+            "Avoid overhead irrigation",
+        ],
+    },
+    {
+        "name": "Low Humidity",
+        "level": "warning",
+        "conditions": [("humidity", "<", 40)],
+        "advice": [
+            "Increase irrigation frequency",
+            "Monitor for water stress",
+            "Consider using shade nets",
+            "Apply anti-transpirants if needed",
+            "Schedule irrigation during early morning",
+        ],
+    },
+    {
+        "name": "Heat Stress",
+        "level": "warning",
+        "conditions": [("temperature", ">", 30), ("humidity", ">", 70)],
+        "advice": [
+            "High risk of heat stress in crops",
+            "Increase irrigation frequency",
+            "Consider using shade nets",
+            "Monitor for wilting",
+            "Apply anti-transpirants if needed",
+        ],
+    },
+    {
+        "name": "Storm",
+        "level": "warning",
+        "conditions": [("rainfall", ">", 5), ("wind_speed", ">", 20)],
+        "advice": [
+            "Secure farm equipment and structures",
+            "Postpone all field operations",
+            "Check drainage systems",
+            "Prepare for potential crop damage",
+            "Monitor for waterlogging",
+        ],
+    },
+]
+
+_ICONS = {"warning": "⚠️", "info": "ℹ️"}
+
+
+def format_alert(rule):
+    """Markdown body for a rule, as shown in the Weather tab."""
+    title = rule["name"] if rule["level"] == "info" else f"{rule['name']} Alert"
+    lines = [f"{_ICONS.get(rule['level'], '')} **{title}**"]
+    lines.extend(f"- {advice}" for advice in rule["advice"])
+    return "\n".join(lines)
+
+
+def _location_keys(forecast_df):
+    keys = [c for c in LOCATION_COLUMNS if c in forecast_df.columns]
+    if not keys:
+        return None
+    return forecast_df.groupby(keys, sort=False).ngroup().to_numpy()
+
+
+def evaluate_alerts(forecast_df, rules=ALERT_RULES):
+    """Boolean (slots x rules) DataFrame: which rules fire at which slot."""
+    groups = _location_keys(forecast_df)
+    columns = {}
+    masks = {}
+    for rule in rules:
+        mask = np.ones(len(forecast_df), dtype=bool)
+        for column, op, threshold in rule["conditions"]:
+            if column not in columns:
+                if column in DERIVED_COLUMNS:
+                    columns[column] = DERIVED_COLUMNS[column](forecast_df, groups).to_numpy()
+                else:
+                    columns[column] = forecast_df[column].to_numpy()
+            mask &= OPERATORS[op](columns[column], threshold)
+        masks[rule["name"]] = mask
+    return pd.DataFrame(masks, index=forecast_df.index)
+
+
+def current_alerts(forecast_df, rules=ALERT_RULES):
+    """Rules firing at the first (current) slot of a single-location forecast."""
+    if len(forecast_df) == 0:
+        return []
+    first = evaluate_alerts(forecast_df, rules).iloc[0].to_numpy()
+    return [rule for rule, fired in zip(rules, first) if fired]
+
+
+def alert_timeline(forecast_df, rules=ALERT_RULES):
+    """Collapse firing rules into (location, alert, level, start, end, slots) rows.
+
+    Consecutive slots of the same location for which a rule fires become one
+    row. Expects slots ordered by date within each location.
+    """
+    keys = [c for c in LOCATION_COLUMNS if c in forecast_df.columns]
+    masks = evaluate_alerts(forecast_df, rules).to_numpy()
+    groups = _location_keys(forecast_df)
+    if groups is None:
+        groups = np.zeros(len(forecast_df), dtype=np.intp)
+
+    # A run starts where the rule fires and either the previous slot did not
+    # or the previous slot belongs to another location; likewise for ends.
+    same_as_prev = np.r_[False, groups[1:] == groups[:-1]][:, None]
+    same_as_next = np.r_[groups[1:] == groups[:-1], False][:, None]
+    prev = np.vstack([np.zeros((1, masks.shape[1]), dtype=bool), masks[:-1]])
+    nxt = np.vstack([masks[1:], np.zeros((1, masks.shape[1]), dtype=bool)])
+    starts = masks & ~(prev & same_as_prev)
+    ends = masks & ~(nxt & same_as_next)
+
+    # Transposed nonzero walks each rule column in row order, so the k-th
+    # start of a rule pairs with its k-th end
+    start_rule, start_row = np.nonzero(starts.T)
+    _, end_row = np.nonzero(ends.T)
+
+    dates = forecast_df["date"].to_numpy()
+    timeline = pd.DataFrame({c: forecast_df[c].to_numpy()[start_row] for c in keys})
+    timeline["alert"] = np.array([r["name"] for r in rules], dtype=object)[start_rule]
+    timeline["level"] = np.array([r["level"] for r in rules], dtype=object)[start_rule]
+    timeline["start"] = dates[start_row]
+    timeline["end"] = dates[end_row]
+    timeline["slots"] = end_row - start_row + 1
+    return timeline.sort_values(keys + ["start", "alert"], kind="stable").reset_index(drop=True)
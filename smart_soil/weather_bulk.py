@@ -0,0 +1,103 @@
+"""Concurrent forecast fetching for many field locations.
+
+Requests go through the shared pooled WeatherClient (so caching, retries and
+the circuit breaker still apply) on a bounded thread pool driven by asyncio.
+A token bucket keeps the call rate under the API plan's quota, and a 429
+from the upstream pauses every pending request, not only the one that got it.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from smart_soil.weather import parse_forecasts
+from smart_soil.weather_client import WeatherAPIError, default_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 16
+# Free OpenWeatherMap plans allow 60 calls per minute
+DEFAULT_RATE = 60
+DEFAULT_PERIOD = 60.0
+
+
+class AsyncRateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per ``period`` seconds."""
+
+    def __init__(self, rate=DEFAULT_RATE, period=DEFAULT_PERIOD, clock=time.monotonic):
+        self.rate = rate
+        self.period = period
+        self.clock = clock
+        self._tokens = float(rate)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+
+    def pause(self, seconds):
+        # Called when the upstream reports 429; holds back all callers
+        self._paused_until = max(self._paused_until, self.clock() + seconds)
+        self._tokens = 0.0
+
+
+async def fetch_forecasts_async(locations, api_key, client=None, concurrency=DEFAULT_CONCURRENCY,
+                                rate=DEFAULT_RATE, period=DEFAULT_PERIOD):
+    """Fetch forecasts for ``locations`` (an iterable of (lat, lon)) concurrently.
+
+    Returns one DataFrame with ``latitude``/``longitude`` columns followed by
+    the usual forecast columns. Locations that failed are listed with their
+    error message in ``df.attrs["errors"]``.
+    """
+    client = client or default_client()
+    limiter = AsyncRateLimiter(rate, period)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    locations = list(dict.fromkeys((float(lat), float(lon)) for lat, lon in locations))
+    errors = {}
+
+    async def fetch(executor, latitude, longitude):
+        async with semaphore:
+            # Fresh cache hits don't spend rate limit tokens
+            payload = client.cache.get(latitude, longitude)
+            if payload is None:
+                await limiter.acquire()
+                try:
+                    payload = await loop.run_in_executor(
+                        executor, client.get_forecast, latitude, longitude, api_key)
+                except WeatherAPIError as e:
+                    if e.status_code == 429:
+                        limiter.pause(period / rate * concurrency)
+                    errors[(latitude, longitude)] = str(e)
+                    return None
+                except Exception as e:
+                    # Anything else fails only this location, not the batch
+                    logger.exception("Forecast fetch failed for %s, %s", latitude, longitude)
+                    errors[(latitude, longitude)] = str(e)
+                    return None
+            return payload
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="weather") as executor:
+        payloads = await asyncio.gather(*(fetch(executor, lat, lon) for lat, lon in locations))
+
+    # One columnar parse over every location's slots
+    result = parse_forecasts({loc: p for loc, p in zip(locations, payloads) if p is not None})
+    result.attrs["errors"] = errors
+    return result
+
+
+def fetch_forecasts(locations, api_key, **kwargs):
+    """Blocking wrapper around :func:`fetch_forecasts_async`."""
+    return asyncio.run(fetch_forecasts_async(locations, api_key, **kwargs))
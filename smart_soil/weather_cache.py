@@ -0,0 +1,121 @@
+"""Location-keyed TTL cache for OpenWeatherMap forecast payloads.
+
+The 5 day / 3 hour forecast only changes every few hours, and most users
+look at the same districts, so raw API payloads are cached per rounded
+(lat, lon). An in-memory LRU sits in front of an optional SQLite file that
+survives restarts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30 * 60
+DEFAULT_MAXSIZE = 512
+# 2 decimals is roughly 1 km, well below the forecast grid resolution
+DEFAULT_PRECISION = 2
+# Entries older than this are dropped even when serving stale data
+DEFAULT_MAX_STALE = 24 * 60 * 60
+
+
+class ForecastCache:
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE, precision=DEFAULT_PRECISION,
+                 db_path=None, max_stale=DEFAULT_MAX_STALE, clock=time.time):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.precision = precision
+        self.max_stale = max(max_stale, ttl)
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                "key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def key(self, latitude, longitude):
+        return f"{round(float(latitude), self.precision):.{self.precision}f}," \
+               f"{round(float(longitude), self.precision):.{self.precision}f}"
+
+    def get(self, latitude, longitude, allow_stale=False):
+        """Return the cached payload, or None when missing or expired.
+
+        With ``allow_stale`` an expired entry is still returned as long as it
+        is younger than ``max_stale``; used to ride out upstream outages.
+        """
+        key = self.key(latitude, longitude)
+        max_age = self.max_stale if allow_stale else self.ttl
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT fetched_at, payload FROM forecasts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._store(key, entry)
+            if entry is None or now - entry[0] > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, latitude, longitude, payload):
+        key = self.key(latitude, longitude)
+        entry = (self.clock(), payload)
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO forecasts (key, fetched_at, payload) VALUES (?, ?, ?)",
+                    (key, entry[0], json.dumps(payload)),
+                )
+                self._db.execute("DELETE FROM forecasts WHERE fetched_at < ?", (entry[0] - self.max_stale,))
+                self._db.commit()
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM forecasts")
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide cache configured from the environment.
+
+    WEATHER_CACHE_TTL (seconds), WEATHER_CACHE_SIZE and WEATHER_CACHE_DB
+    (path of the SQLite file, unset for memory only).
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ForecastCache(
+                ttl=float(os.environ.get("WEATHER_CACHE_TTL", DEFAULT_TTL)),
+                maxsize=int(os.environ.get("WEATHER_CACHE_SIZE", DEFAULT_MAXSIZE)),
+                db_path=os.environ.get("WEATHER_CACHE_DB") or None,
+            )
+        return _default_cache
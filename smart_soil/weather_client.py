@@ -0,0 +1,222 @@
+"""OpenWeatherMap forecast client.
+
+One pooled ``requests.Session`` is shared by every caller in the process.
+Each call has connect/read timeouts, transient failures (connection and
+other transport errors, timeouts, undecodable bodies, 429 and 5xx) are
+retried with jittered exponential backoff, and a circuit breaker stops
+hammering a failing upstream, serving the last cached forecast for the
+location instead.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from smart_soil.weather_cache import default_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://api.openweathermap.org/data/2.5/forecast"
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 8.0
+DEFAULT_POOL_SIZE = 32
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class WeatherAPIError(Exception):
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class CircuitOpenError(WeatherAPIError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open every call is rejected; after ``reset_timeout`` seconds a
+    single trial call is let through (half-open) and its outcome decides
+    whether the circuit closes again or stays open for another period.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_flight or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+
+class WeatherClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, pool_size=DEFAULT_POOL_SIZE,
+                 cache=None, breaker=None, sleep=time.sleep):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache = cache if cache is not None else default_cache()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+        # Imported here so importing this module stays cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_forecast(self, latitude, longitude, api_key, use_cache=True):
+        """Return the raw forecast payload for a location.
+
+        Fresh cache entries are served without a request. When the upstream
+        is failing (circuit open or retries exhausted) a stale cached payload
+        is returned if there is one; otherwise WeatherAPIError is raised.
+        """
+        return self.fetch_forecast(latitude, longitude, api_key, use_cache)[0]
+
+    def fetch_forecast(self, latitude, longitude, api_key, use_cache=True):
+        """Like ``get_forecast`` but returns ``(payload, stale)``.
+
+        ``stale`` is True when the upstream failed and the payload is the
+        last cached forecast rather than a fresh one.
+        """
+        if use_cache:
+            cached = self.cache.get(latitude, longitude)
+            if cached is not None:
+                return cached, False
+
+        if not self.breaker.allow():
+            return self._stale_or_raise(latitude, longitude, CircuitOpenError(
+                "Weather service is temporarily unavailable", retryable=True))
+
+        params = {"lat": latitude, "lon": longitude, "appid": api_key, "units": "metric"}
+        try:
+            payload = self.request(params)
+        except WeatherAPIError as e:
+            if not e.retryable:
+                # The upstream answered; a bad key or location is not an outage
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            return self._stale_or_raise(latitude, longitude, e)
+        except BaseException:
+            # Every call must settle the breaker, or a half-open trial would
+            # stay in flight and reject all later calls
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        self.cache.put(latitude, longitude, payload)
+        return payload, False
+
+    def test_connection(self, api_key, latitude=20.5937, longitude=78.9629):
+        # Always goes upstream so a bad key is reported even with a warm cache
+        self.request({"lat": latitude, "lon": longitude, "appid": api_key, "units": "metric"}, retries=0)
+        return True
+
+    def request(self, params, retries=None):
+        import requests
+
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = WeatherAPIError(f"Connection error: {e}", retryable=True)
+                retry_after = None
+            else:
+                retry_after = _retry_after(response)
+                if response.status_code == 200:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        error = WeatherAPIError(f"Invalid forecast response: {e}", 200, retryable=True)
+                else:
+                    error = WeatherAPIError(_error_message(response), response.status_code,
+                                            retryable=response.status_code in RETRYABLE_STATUS)
+            if not error.retryable or attempt == retries:
+                raise error
+            self.sleep(self._backoff_delay(attempt, retry_after))
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        # Full jitter: uniform in [0, min(max_backoff, backoff * 2**attempt)]
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def _stale_or_raise(self, latitude, longitude, error):
+        stale = self.cache.get(latitude, longitude, allow_stale=True)
+        if stale is None:
+            raise error
+        logger.warning("Serving cached forecast for %s, %s: %s", latitude, longitude, error)
+        return stale, True
+
+    def close(self):
+        self.session.close()
+
+
+def _error_message(response):
+    try:
+        return response.json().get("message", "Unknown error")
+    except ValueError:
+        return f"HTTP {response.status_code}"
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Process-wide client; OPENWEATHER_BASE_URL points it at a stub server."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = WeatherClient(base_url=os.environ.get("OPENWEATHER_BASE_URL", DEFAULT_BASE_URL))
+        return _default_client
@@ -1,61 +1,295 @@
+"""Train the fertilizer recommendation model.
+
+    python train_fertilizer_model.py [--data dataset.csv] [--output fertilizer_model.pkl]
+    python train_fertilizer_model.py --data archive.csv --chunksize 1000000 [--warm-start fertilizer_model.pkl]
+
+Trees are fitted on all cores and the class balancing sample is seeded, so
+the same data and arguments always produce the same model. Wall-clock time
+and the process's peak RSS are reported for every stage, and peak traced
+memory too with ``--profile-memory`` (tracing slows training down, so it is
+off by default). The held-out rows are split off before class balancing, so
+none of them is resampled into the training set.
+
+With ``--chunksize`` the CSV is streamed instead of loaded: each chunk is
+parsed with compact dtypes and folded into a fixed-size reservoir sample
+per fertilizer, so memory stays bounded however large the file is. In
+either mode the file is read once: its sha256, recorded with the exported
+forest, is computed from the bytes as they are parsed.
+
+Next to the pickle the model is exported as a flat forest directory
+(``fertilizer_model.forest``), which the app loads without scikit-learn.
+An older forest there is removed first, so with ``--no-export`` (or a
+failed export) the app falls back to the new pickle instead of serving the
+previous model.
+"""
+import argparse
+import hashlib
+import io
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
 
-import pandas as pd
-import numpy as np
 import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.utils import resample
+import numpy as np
+import pandas as pd
 
-# Load dataset
-df = pd.read_csv("dataset.csv")
+from smart_soil.forest import export_forest
 
-# Ensure we have diverse fertilizers
-print("Unique Fertilizers:", df["Fertilizer"].unique())
+FEATURES = ["pH", "N", "P", "K", "Moisture"]
+TARGET = "Fertilizer"
+# Trees split on float32 anyway, so narrower features lose nothing
+DTYPES = dict({feature: np.float32 for feature in FEATURES}, **{TARGET: "category"})
 
-# Balance the dataset (optional)
-df_balanced = df.groupby("Fertilizer").apply(lambda x: x.sample(100, replace=True)).reset_index(drop=True)
 
-# Prepare features and labels
-X = df_balanced[["pH", "N", "P", "K", "Moisture"]]
-y = df_balanced["Fertilizer"]
+def peak_rss_mib():
+    """High-water RSS of this process so far, in MiB."""
+    # Linux reports KiB, macOS bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
 
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Train model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+@contextmanager
+def stage(name, timings):
+    """Record wall-clock seconds, peak RSS (MiB) and, while tracemalloc is tracing, peak traced memory of a block.
 
-# Save the model
-joblib.dump(model, "fertilizer_model.pkl")
-print("Model trained and saved successfully!")
-import pandas as pd
-import numpy as np
-import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.utils import resample
+    Peak RSS is a process-wide high-water mark, so it only grows from stage
+    to stage; it costs nothing to read, unlike tracing.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    rss = peak_rss_mib()
+    traced = tracemalloc.get_traced_memory()[1] / 2 ** 20 if tracing else None
+    timings.append((name, elapsed, rss, traced))
+    print(f"[{name}] {elapsed:.2f}s, peak RSS {rss:.1f} MiB" + (f", peak traced {traced:.1f} MiB" if tracing else ""))
+
+
+def balance(df, samples_per_class, seed):
+    """Resample every fertilizer class to ``samples_per_class`` rows (with replacement)."""
+    return df.groupby(TARGET, group_keys=False).sample(samples_per_class, replace=True, random_state=seed) \
+        .reset_index(drop=True)
+
+
+class ClassReservoir:
+    """Uniform sample of at most ``size`` rows per class over a stream (Algorithm R).
+
+    Every class draws from its own generator seeded with ``seed`` and the
+    class name, so the sample does not depend on how the stream is chunked.
+    """
+
+    def __init__(self, size, n_features, seed):
+        self.size = size
+        self.n_features = n_features
+        self.seed = seed
+        self.samples = {}
+        self.seen = {}
+        self._rngs = {}
+
+    def add(self, label, values):
+        values = np.asarray(values, dtype=np.float32)
+        if label not in self.samples:
+            self.samples[label] = np.empty((self.size, self.n_features), dtype=np.float32)
+            self.seen[label] = 0
+            self._rngs[label] = np.random.default_rng([self.seed, zlib.crc32(label.encode())])
+        sample = self.samples[label]
+        positions = self.seen[label] + np.arange(len(values))
+        self.seen[label] += len(values)
+
+        fill = positions < self.size
+        sample[positions[fill]] = values[fill]
+        # Row t replaces a random slot with probability size / (t + 1); later
+        # rows win when two pick the same slot, as in the sequential algorithm
+        slots = self._rngs[label].integers(0, positions[~fill] + 1)
+        keep = slots < self.size
+        sample[slots[keep]] = values[~fill][keep]
+
+    def add_frame(self, frame):
+        for label, rows in frame.groupby(TARGET, observed=True):
+            self.add(str(label), rows[FEATURES].to_numpy())
+
+    def frame(self):
+        labels = sorted(self.samples)
+        parts = [self.samples[label][:min(self.seen[label], self.size)] for label in labels]
+        df = pd.DataFrame(np.concatenate(parts) if parts else np.empty((0, self.n_features)), columns=FEATURES)
+        df[TARGET] = np.repeat(labels, [len(part) for part in parts])
+        return df
+
+
+# pandas can't infer compression from a file object
+COMPRESSION = {".gz": "gzip", ".bz2": "bz2", ".zip": "zip", ".xz": "xz", ".zst": "zstd"}
+
+
+class HashingFile(io.RawIOBase):
+    """Binary file hashing every byte read through it, so the training data
+    is fingerprinted in the same pass that parses it."""
+
+    def __init__(self, path):
+        super().__init__()
+        self._file = open(path, "rb")
+        self._digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._file.readinto(buffer)
+        self._digest.update(memoryview(buffer)[:n])
+        return n
+
+    def hexdigest(self):
+        # Bytes the parser never asked for still count
+        for chunk in iter(lambda: self._file.read(1 << 20), b""):
+            self._digest.update(chunk)
+        return self._digest.hexdigest()
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def stream_sample(data, samples_per_class, seed, chunksize, compression="infer"):
+    """One pass over ``data`` (a path or binary file) in chunks, keeping a reservoir sample per class."""
+    reservoir = ClassReservoir(samples_per_class, len(FEATURES), seed)
+    with pd.read_csv(data, usecols=FEATURES + [TARGET], dtype=DTYPES, chunksize=chunksize,
+                     compression=compression) as chunks:
+        for chunk in chunks:
+            reservoir.add_frame(chunk.dropna())
+    return reservoir
+
+
+def save_model(model, path, compress=0):
+    # Dump next to the target and rename, so the app never loads a half-written file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp_path, compress=compress)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def warm_start_model(path, n_estimators, n_jobs, seed):
+    """Load an existing forest and set it up to grow ``n_estimators`` more trees, seeded with ``seed``."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = joblib.load(path)
+    if not isinstance(model, RandomForestClassifier):
+        raise ValueError(f"{path} does not hold a RandomForestClassifier")
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_estimators, n_jobs=n_jobs,
+                     random_state=seed)
+    return model
+
+
+def train(data, output, samples_per_class=100, n_estimators=100, n_jobs=-1, seed=42, test_size=0.2,
+          compress=0, chunksize=None, warm_start=None, export=True, profile_memory=False):
+    # scikit-learn takes seconds to import; only pay for it when training
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+
+    timings = []
+    if profile_memory:
+        tracemalloc.start()
+    try:
+        with stage("load", timings):
+            compression = COMPRESSION.get(os.path.splitext(data)[1].lower())
+            with HashingFile(data) as source:
+                csv = io.BufferedReader(source, 1 << 20)
+                if chunksize:
+                    reservoir = stream_sample(csv, samples_per_class, seed, chunksize, compression)
+                    print(f"Streamed {sum(reservoir.seen.values())} rows")
+                    df = reservoir.frame()
+                else:
+                    df = pd.read_csv(csv, usecols=FEATURES + [TARGET], dtype=DTYPES, compression=compression)
+                training_hash = source.hexdigest()
+            df[TARGET] = df[TARGET].astype(str)
+            # Ensure we have diverse fertilizers
+            print("Unique Fertilizers:", df[TARGET].unique())
+
+        with stage("balance", timings):
+            # Split first: balancing resamples with replacement, and copies of
+            # test rows in the training set would inflate the held-out score
+            if test_size:
+                counts = df[TARGET].value_counts()
+                df_train, df_test = train_test_split(
+                    df, test_size=test_size, random_state=seed,
+                    stratify=df[TARGET] if counts.min() >= 2 and len(df) * test_size >= len(counts) else None)
+            else:
+                df_train, df_test = df, df.iloc[:0]
+            # The reservoir already holds a uniform sample of each class; this
+            # tops small classes up (with replacement) to the same size
+            df_balanced = balance(df_train, samples_per_class, seed)
+            X_train, y_train = df_balanced[FEATURES], df_balanced[TARGET]
+            X_test, y_test = df_test[FEATURES], df_test[TARGET]
 
-# Load dataset
-df = pd.read_csv("dataset.csv")
+        with stage("fit", timings):
+            if warm_start:
+                model = warm_start_model(warm_start, n_estimators, n_jobs, seed)
+                if set(model.classes_) != set(y_train):
+                    raise ValueError("Warm start needs the same fertilizer classes as the existing model")
+            else:
+                model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=seed)
+            model.fit(X_train, y_train)
+            if len(X_test):
+                print(f"Held-out accuracy: {model.score(X_test, y_test):.3f}")
 
-# Ensure we have diverse fertilizers
-print("Unique Fertilizers:", df["Fertilizer"].unique())
+        with stage("dump", timings):
+            forest_dir = os.path.splitext(output)[0] + ".forest"
+            # The app prefers the forest, so one left from an earlier model
+            # would shadow the new pickle
+            if os.path.isdir(forest_dir):
+                shutil.rmtree(forest_dir)
+                if not export:
+                    print(f"Removed outdated flat forest {forest_dir}")
+            save_model(model, output, compress)
+            if export:
+                export_forest(model, forest_dir, training_hash=training_hash)
+                print(f"Exported flat forest to {forest_dir}")
+    finally:
+        if profile_memory:
+            tracemalloc.stop()
 
-# Balance the dataset (optional)
-df_balanced = df.groupby("Fertilizer").apply(lambda x: x.sample(100, replace=True)).reset_index(drop=True)
+    total = sum(timing[1] for timing in timings)
+    print(f"Model trained and saved to {output} in {total:.2f}s")
+    return model, timings
 
-# Prepare features and labels
-X = df_balanced[["pH", "N", "P", "K", "Moisture"]]
-y = df_balanced["Fertilizer"]
 
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the fertilizer recommendation model.")
+    parser.add_argument("--data", default="dataset.csv", help="training CSV (default: %(default)s)")
+    parser.add_argument("--output", default="fertilizer_model.pkl", help="model file (default: %(default)s)")
+    parser.add_argument("--samples-per-class", type=int, default=100,
+                        help="rows per fertilizer after balancing (default: %(default)s)")
+    parser.add_argument("--n-estimators", type=int, default=100, help="number of trees (default: %(default)s)")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="parallel jobs for fitting, -1 for all cores (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: %(default)s)")
+    parser.add_argument("--test-size", type=float, default=0.2,
+                        help="held-out fraction (default: %(default)s)")
+    parser.add_argument("--compress", type=int, default=0, help="joblib compression level (default: %(default)s)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the CSV in chunks of this many rows with bounded memory")
+    parser.add_argument("--warm-start", metavar="MODEL", default=None,
+                        help="add --n-estimators trees to an existing model instead of starting over")
+    parser.add_argument("--no-export", dest="export", action="store_false",
+                        help="skip writing the flat .forest directory next to the model (an old one is removed)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="report peak traced memory per stage (slows training down)")
+    args = parser.parse_args(argv)
+    train(args.data, args.output, samples_per_class=args.samples_per_class, n_estimators=args.n_estimators,
+          n_jobs=args.n_jobs, seed=args.seed, test_size=args.test_size, compress=args.compress,
+          chunksize=args.chunksize, warm_start=args.warm_start, export=args.export,
+          profile_memory=args.profile_memory)
 
-# Train model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
 
-# Save the model
-joblib.dump(model, "fertilizer_model.pkl")
-print("Model trained and saved successfully!")
+if __name__ == "__main__":
+    main()